@@ -0,0 +1,314 @@
+'''
+reproducible speed benchmarks of the measurement, generation and transform hot paths
+
+all inputs are created with fixed seeds, results are written as JSON
+together with platform and package versions, so runs of different releases
+or with optional accelerated backends can be compared:
+
+    python benchmark.py -o before.json
+    python benchmark.py -o after.json --compare before.json
+    python benchmark.py -k measureVcut --quick
+'''
+
+import argparse
+import json
+import platform
+import os
+import subprocess
+import sys
+import timeit
+from collections import OrderedDict
+from datetime import datetime
+
+import cv2
+import numpy as np
+import scipy
+
+SEED = 0
+# benchmark name -> (setup function, parameters)
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name, **params):
+    '''
+    register a benchmark
+    the decorated function gets [params] and returns a function without arguments
+    whose execution time is measured
+    '''
+    def decorator(setup):
+        key = name
+        if params:
+            key += '[%s]' % ','.join('%s=%s' % kv for kv in params.items())
+        BENCHMARKS[key] = (setup, params)
+        return setup
+    return decorator
+
+
+def _vcut(size, std=2, seed=SEED):
+    from generate import patVcut
+    rng = np.random.default_rng(seed)
+    return patVcut(std, phi=1, angle_rad=0.08, size=size, rng=rng)
+
+
+# measurement:
+for _size in (501, 1001):
+    for _width in (51, 101):
+        for _inputs in ('masked', 'unmasked', 'unmasked+bg'):
+            @benchmark('measureVcut', size=_size, max_width=_width, inputs=_inputs)
+            def _measureVcut(size, max_width, inputs):
+                from measure import measureVcut
+                img_masked, img_unmasked, line = _vcut(size)
+                img_bg = None
+                if inputs == 'masked':
+                    img_unmasked = None
+                elif inputs == 'unmasked+bg':
+                    img_bg = np.random.default_rng(SEED).random((size, size)) * 0.01
+                    img_masked += img_bg
+                    img_unmasked += img_bg
+                return lambda: measureVcut(img_masked, line, img_unmasked, img_bg,
+                                           max_width=max_width)
+
+
+@benchmark('measureVcut', size=501, n_rays=9)
+def _measureVcutRays(size, n_rays):
+    from measure import measureVcut
+    img_masked, img_unmasked, line = _vcut(size)
+    return lambda: measureVcut(img_masked, line, img_unmasked, n_rays=n_rays)
+
+
+for _dtype in ('float64', 'float32'):
+    @benchmark('measureVcut', size=1001, inputs='uint16', dtype=_dtype)
+    def _measureVcutDtype(size, inputs, dtype):
+        from measure import measureVcut
+        img_masked, img_unmasked, line = _vcut(size)
+        img_masked = (img_masked * 4000).astype(inputs)
+        img_unmasked = (img_unmasked * 4000).astype(inputs)
+        return lambda: measureVcut(img_masked, line, img_unmasked, dtype=dtype)
+
+    @benchmark('measureVcutStack', n=16, size=501, dtype=_dtype)
+    def _measureVcutStack(n, size, dtype):
+        from generate import patVcutBatch
+        from measure import measureVcutStack
+        masked, unmasked, lines, _ = patVcutBatch(n, 2, phi=1, angle_rad=0.08, size=size,
+                                                  dtype=float, rng=SEED)
+        return lambda: measureVcutStack(masked, lines, unmasked, dtype=dtype)
+
+
+for _size in (501, 5001):
+    @benchmark('locateVcut', size=_size)
+    def _locateVcut(size):
+        from locate import locateVcut
+        img_masked = _vcut(size)[0].astype(np.float32)
+        return lambda: locateVcut(img_masked)
+
+
+# generation:
+for _size in (501, 1001):
+    @benchmark('patVcut', size=_size)
+    def _patVcut(size):
+        from generate import patVcut
+        rng = np.random.default_rng(SEED)
+        return lambda: patVcut(2, phi=1, angle_rad=0.08, size=size, rng=rng)
+
+    @benchmark('patSiemensStar', size=_size)
+    def _patSiemensStar(size):
+        from generate import patSiemensStar
+        return lambda: patSiemensStar(size)
+
+
+# helpers:
+@benchmark('alignImageAlongLine', size=1001, height=101)
+def _alignImageAlongLine(size, height):
+    from utils.alignImageAlongLine import alignImageAlongLine
+    img_masked, _, line = _vcut(size)
+    return lambda: alignImageAlongLine(img_masked, line, height)
+
+
+@benchmark('cutToFitIntoPolygon', n=1000)
+def _cutToFitIntoPolygon(n):
+    from utils.line import cutToFitIntoPolygon
+    lines = np.random.default_rng(SEED).uniform(-100, 600, (n, 4))
+    poly = ((0, 0), (501, 0), (501, 501), (0, 501), (0, 0))
+    return lambda: [cutToFitIntoPolygon(l, poly) for l in lines]
+
+
+@benchmark('clipLines', n=1000)
+def _clipLines(n):
+    from utils.line import clipLines
+    lines = np.random.default_rng(SEED).uniform(-100, 600, (n, 4))
+    poly = ((0, 0), (501, 0), (501, 501), (0, 501), (0, 0))
+    return lambda: clipLines(lines, poly)
+
+
+def _profile(seed=SEED):
+    from measure import measureVcut
+    img_masked, img_unmasked, line = _vcut(501, seed=seed)
+    return measureVcut(img_masked, line, img_unmasked)[0]
+
+
+@benchmark('findXAt')
+def _findXAt():
+    from utils.findXAt import findXAt
+    r, y, _ = _profile()
+    return lambda: findXAt(r, y, 0.5)
+
+
+@benchmark('findCrossing', n=100)
+def _findCrossing(n):
+    from utils.findXAt import findCrossing
+    r, y, _ = _profile()
+    y = np.repeat(y[np.newaxis], n, axis=0)
+    return lambda: findCrossing(r, y, 0.5)
+
+
+@benchmark('resolutionFactor')
+def _resolutionFactor():
+    from resolutionFactor import resolutionFactor
+    r, y, angle = _profile()
+    return lambda: resolutionFactor(r, y, angle)
+
+
+for _n in (1, 10000):
+    @benchmark('resFactor2std', n=_n)
+    def _resFactor2std(n):
+        from utils.transforms import resFactor2std
+        fres = np.random.default_rng(SEED).uniform(0.5, 10, n)
+        if n == 1:
+            fres = float(fres[0])
+        return lambda: resFactor2std(fres)
+
+
+for _engine in ('spatial', 'fft'):
+    @benchmark('relation_resolutionFactor_vs_std.calc', s0=300, N=5, engine=_engine)
+    def _calc(s0, N, engine):
+        from generate import patSiemensStar
+        from relation_resolutionFactor_vs_std import calc
+        return lambda: calc(patSiemensStar, s0, N, engine)
+
+
+# cold start (new interpreter) - interpreter start up alone is 'import[None]':
+for _module in (None, 'numpy', 'cv2', 'utils.transforms', 'resolutionFactor', 'measure',
+                'generate', 'fromFile'):
+    @benchmark('import', module=_module)
+    def _import(module):
+        code = 'pass' if module is None else 'import %s' % module
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        return lambda: subprocess.run([sys.executable, '-c', code], cwd=cwd, check=True)
+
+
+def run(fn, repeat=5, min_time=0.2):
+    '''
+    execution times [s] of [fn]
+    number of calls per measurement is chosen so that each takes >= [min_time] s
+    returns dict of statistics
+    '''
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        t = timer.timeit(number)
+        if t >= min_time or number >= 1e6:
+            break
+        number *= max(2, min(10, int(1.2 * min_time / max(t, 1e-9))))
+    times = np.array([t] + timer.repeat(repeat - 1, number)) / number
+    return OrderedDict([('min', float(times.min())),
+                        ('median', float(np.median(times))),
+                        ('max', float(times.max())),
+                        ('number', number),
+                        ('repeat', repeat)])
+
+
+def environment():
+    '''
+    platform, package versions and git revision
+    '''
+    env = OrderedDict([
+        ('date', datetime.now().isoformat(timespec='seconds')),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('processor', platform.processor() or platform.machine()),
+        ('numpy', np.__version__),
+        ('scipy', scipy.__version__),
+        ('opencv', cv2.__version__),
+        ('opencv_threads', cv2.getNumThreads())])
+    try:
+        env['git'] = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        env['git'] = None
+    return env
+
+
+def runAll(select=None, repeat=5, min_time=0.2, quick=False, log=None):
+    '''
+    select ... only run benchmarks whose name contains this string
+    quick  ... single measurement of a single call - for smoke tests
+    log    ... file to print progress to
+
+    returns dict {'environment':{...}, 'benchmarks':{name:{'params', 'min', ...}}}
+    '''
+    if quick:
+        repeat, min_time = 1, 0
+    results = OrderedDict()
+    for name, (setup, params) in BENCHMARKS.items():
+        if select and select not in name:
+            continue
+        np.random.seed(SEED)
+        fn = setup(**params)
+        result = run(fn, repeat, min_time)
+        result['params'] = params
+        results[name] = result
+        if log is not None:
+            print('%-70s %10.3f ms' % (name, result['min'] * 1e3), file=log)
+    return OrderedDict([('environment', environment()), ('benchmarks', results)])
+
+
+def compare(new, old, threshold=1.1, log=sys.stdout):
+    '''
+    print speed ratio old/new of all benchmarks in both results
+    returns names of benchmarks that are slower by more than [threshold]
+    '''
+    slower = []
+    print('%-70s %10s %10s %7s' % ('benchmark', 'old [ms]', 'new [ms]', 'speedup'), file=log)
+    for name, res in new['benchmarks'].items():
+        if name not in old['benchmarks']:
+            continue
+        t_old, t_new = old['benchmarks'][name]['min'], res['min']
+        mark = ''
+        if t_new > threshold * t_old:
+            slower.append(name)
+            mark = '  slower'
+        print('%-70s %10.3f %10.3f %6.2fx%s' % (
+            name, t_old * 1e3, t_new * 1e3, t_old / t_new, mark), file=log)
+    return slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Speed benchmarks with fixed seeds')
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='write results to this JSON file')
+    parser.add_argument('-k', '--select', type=str, default=None,
+                        help='only run benchmarks whose name contains this string')
+    parser.add_argument('-c', '--compare', type=str, default=None,
+                        help='JSON file of an earlier run to compare with')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='number of measurements per benchmark')
+    parser.add_argument('--min_time', type=float, default=0.2,
+                        help='minimum duration [s] of a single measurement')
+    parser.add_argument('--quick', action='store_true',
+                        help='call every benchmark only once')
+    parser.add_argument('--list', action='store_true', help='list benchmarks and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(BENCHMARKS))
+        sys.exit()
+
+    results = runAll(args.select, args.repeat, args.min_time, args.quick, log=sys.stdout)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            old = json.load(f)
+        compare(results, old)
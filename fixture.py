@@ -0,0 +1,200 @@
+'''
+measure image sharpness of a v-cut that doesn't move between images
+(e.g. inline tester with fixed camera and mask)
+'''
+
+import cv2
+import numpy as np
+from scipy.ndimage import correlate1d
+
+# local
+from measure import contrastImage, fitVcut, vcutProfile, normalizeProfile, sampleColumns
+from utils.alignImageAlongLine import alignTransform, alignBoundingBox
+from utils.line import cutToFitIntoPolygon
+
+
+class VcutFixture(object):
+    '''
+    v-cut geometry (alignment, fitted v-cut edges, intersection, angle)
+    is only detected once and reused for following images.
+    Following images are only warped and sampled along the known middle line.
+
+    The v-cut edges are checked in a few columns of every image.
+    If they moved more than [drift_tol] px, the geometry is fitted again.
+    The v-cut needs to stay within the sub image defined by [line] and [max_width].
+
+    Fitted edges depend on blur, so reusing them is only valid for (nearly) constant sharpness:
+    edges fitted in an image with 5% smaller std change fres by 3%.
+    Use refit_every=1 if sharpness changes (e.g. while focusing, see stream.py).
+    '''
+
+    def __init__(self, line, img_bg=None, max_width=101,
+                 mask_is_dark=False, v_isDark=None,
+                 refit_every=None, drift_tol=2, n_drift_cols=16, dtype=float):
+        '''
+        line, img_bg, max_width, mask_is_dark, v_isDark ... see measure.measureVcut
+        refit_every ... fit geometry again every n images, only on drift if None
+        drift_tol ... maximum shift [px] of v-cut edges before geometry is fitted again
+        n_drift_cols ... number of columns used to detect drift
+        dtype ... compute dtype, see measure.measureVcut
+        '''
+        self.line = line
+        self.img_bg = img_bg
+        self.max_width = max_width
+        self.mask_is_dark = mask_is_dark
+        self.v_isDark = v_isDark
+        self.refit_every = refit_every
+        self.drift_tol = drift_tol
+        self.n_drift_cols = n_drift_cols
+        self.dtype = dtype
+
+        self.shape = None  # image shape the alignment was calculated for
+        self.n_images = 0
+        self.n_fits = 0
+        self.last_drift = 0.0
+
+    def _setAlignment(self, shape):
+        s0, s1 = shape
+        poly = ((0, 0), (s1, 0), (s1, s0), (0, s0), (0, 0))
+        line = cutToFitIntoPolygon(self.line, poly)
+        self.M, (w, h) = alignTransform(line, self.max_width)
+        # only the region around the v-cut is converted to float (see measure.measureVcut):
+        x0, y0, x1, y1 = alignBoundingBox(line, self.max_width, shape=shape)
+        self.window = slice(y0, y1), slice(x0, x1)
+        # precompute fixed point remap tables (same interpolation as warpAffine):
+        Mi = cv2.invertAffineTransform(self.M)
+        yy, xx = np.mgrid[:h, :w].astype(np.float32)
+        map_x = Mi[0, 0] * xx + Mi[0, 1] * yy + Mi[0, 2] - x0
+        map_y = Mi[1, 0] * xx + Mi[1, 1] * yy + Mi[1, 2] - y0
+        self.map1, self.map2 = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+        self.shape = shape
+
+        self.sub_bg = None
+        # average background level is subtracted before warping (see measure.preprocess):
+        self.bg_level = 0
+        if self.img_bg is not None:
+            if np.ndim(self.img_bg):
+                self.sub_bg = self._warp(self.img_bg)
+            else:
+                self.bg_level = self.img_bg
+
+    def _warp(self, img):
+        # interpolate float values, integer images would be rounded otherwise:
+        img = img[self.window].astype(self.dtype)
+        if self.bg_level:
+            img -= self.bg_level
+        return cv2.remap(img, self.map1, self.map2, cv2.INTER_LINEAR)
+
+    def _align(self, img_masked, img_unmasked=None):
+        if self.shape != img_masked.shape:
+            self._setAlignment(img_masked.shape)
+        sub_masked = self._warp(img_masked)
+        sub_unmasked = None
+        if img_unmasked is not None:
+            sub_unmasked = self._warp(img_unmasked)
+        if self.sub_bg is not None:
+            sub_masked -= self.sub_bg
+            if sub_unmasked is not None:
+                sub_unmasked -= self.sub_bg
+        return sub_masked, sub_unmasked
+
+    def _edges(self, contrast_img):
+        '''
+        position of both v-cut edges in drift detection columns
+        '''
+        # same derivative kernel as cv2.Sobel(ksize=5) in y:
+        d = correlate1d(contrast_img[:, self.drift_cols], [-1, -2, 0, 2, 1],
+                        axis=0, mode='mirror')
+        return np.argmin(d, axis=0), np.argmax(d, axis=0)
+
+    def _fit(self, contrast_img, normalize):
+        self.fit, dsub = fitVcut(contrast_img)
+        (self.r, y, self.angle), self.fitlines = vcutProfile(
+            contrast_img, *self.fit, normalize=normalize)
+        self.start = len(self.fitlines[1]) - len(self.r)
+        # use columns where both edges are clearly separated to detect drift:
+        f1, _, f3 = self.fitlines
+        s0 = contrast_img.shape[0]
+        cols = np.where((np.abs(f3 - f1) > 6)
+                        & (np.minimum(f1, f3) > 2) & (np.maximum(f1, f3) < s0 - 3))[0]
+        self.drift_cols = cols[np.linspace(0, len(cols) - 1,
+                                           min(len(cols), self.n_drift_cols)).astype(int)]
+        self.edges = self._edges(contrast_img)
+        self.n_fits += 1
+        return (self.r, y, self.angle), self.fitlines, (contrast_img, dsub)
+
+    def calibrate(self, img_masked, img_unmasked=None):
+        '''
+        detect v-cut geometry in given images
+        returns same as measure.measureVcut
+        '''
+        self.shape = None
+        sub_masked, sub_unmasked = self._align(img_masked, img_unmasked)
+        contrast_img, self.v_isDark = contrastImage(sub_masked, sub_unmasked,
+                                                    self.mask_is_dark, self.v_isDark)
+        self.n_images += 1
+        return self._fit(contrast_img, normalize=img_unmasked is None)
+
+    def drift(self, contrast_img):
+        '''
+        median shift [px] of v-cut edges relative to last geometry fit
+        '''
+        if not len(self.drift_cols):
+            return 0.0
+        e1, e3 = self._edges(contrast_img)
+        return float(max(np.median(np.abs(e1 - self.edges[0])),
+                         np.median(np.abs(e3 - self.edges[1]))))
+
+    def measure(self, img_masked, img_unmasked=None):
+        '''
+        returns same as measure.measureVcut,
+        but sobel image is None, if geometry was not fitted again
+        '''
+        if self.shape is None:
+            return self.calibrate(img_masked, img_unmasked)
+        sub_masked, sub_unmasked = self._align(img_masked, img_unmasked)
+        contrast_img = contrastImage(sub_masked, sub_unmasked,
+                                     self.mask_is_dark, self.v_isDark)[0]
+        self.n_images += 1
+        normalize = img_unmasked is None
+
+        self.last_drift = self.drift(contrast_img)
+        if (self.last_drift > self.drift_tol
+                or (self.refit_every and self.n_images % self.refit_every == 0)):
+            return self._fit(contrast_img, normalize)
+
+        y = sampleColumns(contrast_img[np.newaxis],
+                          self.fitlines[1][np.newaxis])[0][self.start:]
+        if normalize:
+            normalizeProfile(y)
+        return (self.r, y, self.angle), self.fitlines, (contrast_img, None)
+
+
+if __name__ == '__main__':
+    from time import time
+    from generate import patVcut
+    from measure import measureVcut
+    from resolutionFactor import resolutionFactor
+
+    rng = np.random.default_rng(0)
+    imgs = [patVcut(2, phi=1, angle_rad=0.08, rng=rng)[:2] for _ in range(20)]
+    line = patVcut(2, phi=1, angle_rad=0.08, rng=rng)[2]
+
+    fixture = VcutFixture(line)
+    fixture.calibrate(*imgs[0])
+
+    t0 = time()
+    fres0 = [resolutionFactor(*measureVcut(m, line, u)[0]) for m, u in imgs]
+    t_single = time() - t0
+    t0 = time()
+    fres1 = [resolutionFactor(*fixture.measure(m, u)[0]) for m, u in imgs]
+    t_fixture = time() - t0
+    print('fres measureVcut:', np.mean(fres0), '+-', np.std(fres0))
+    print('fres fixture:', np.mean(fres1), '+-', np.std(fres1))
+    print('images/s measureVcut: %.1f, fixture: %.1f' % (
+        len(imgs) / t_single, len(imgs) / t_fixture))
+
+    # move v-cut -> geometry is fitted again:
+    m, u, _ = patVcut(2, phi=1.1, angle_rad=0.08, rng=rng)
+    fixture.measure(m, u)
+    print('drift: %.1f px, geometry fits: %i' % (fixture.last_drift, fixture.n_fits))
@@ -1,57 +1,285 @@
-import cv2
 import argparse
+import csv
+import glob
+import json
+import os
 import sys
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import time
 # local
+from locate import locateVcut
 from measure import measureVcut
+from utils.findXAt import findCrossing
+from utils.imgIO import imread
+from utils.stageStats import StageStats
 from utils.transforms import resFactor2std
 from resolutionFactor import resolutionFactor
 
-# use in a command line 
+# use in a command line
 # >> python fromFile.py ""
 
+IMG_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+MANIFEST_EXTENSIONS = ('.csv', '.jsonl')
+FIELDS = ('masked', 'fres', 'std', 'angle', 'r50', 't_read', 't_measure', 'error')
+
+
+def parseLine(line):
+    '''
+    line as string 'x0,y0,x1,y1' -> [x0,y0,x1,y1]
+    '''
+    try:
+        line = line.split(',')
+        if(len(line) != 4):
+            raise Exception()
+        return [float(l) for l in line]
+    except:
+        raise Exception("need to write line as x0,y0,x1,y1  e.g.: 10,20,100,25")
+
+
+def isBatchSource(source):
+    '''
+    whether [source] is a directory, a glob pattern or a manifest file
+    '''
+    return (os.path.isdir(source)
+            or glob.has_magic(source)
+            or source.lower().endswith(MANIFEST_EXTENSIONS))
+
+
+def entriesFromSource(source, line=None, unmasked=None, background=None):
+    '''
+    source ... directory, glob pattern (e.g. 'imgs/*.png') or manifest file
+               manifest files (.csv with header or .jsonl) contain the columns
+               masked, line, [unmasked], [background]
+               relative paths in manifest files are relative to the manifest directory,
+               [unmasked] and [background] arguments to the working directory
+    line, unmasked, background ... used for all masked images of a directory/glob pattern
+                                   and if not given in manifest
+
+    returns list of dicts {'masked', 'line', 'unmasked', 'background'}
+    '''
+    default = {'line': line, 'unmasked': unmasked, 'background': background}
+    if source.lower().endswith(MANIFEST_EXTENSIONS):
+        root = os.path.dirname(source)
+        with open(source, 'r') as f:
+            if source.lower().endswith('.jsonl'):
+                rows = [json.loads(l) for l in f if l.strip()]
+            else:
+                rows = list(csv.DictReader(f))
+        entries = []
+        for row in rows:
+            entry = dict(default)
+            entry.update({k: v for k, v in row.items() if v})
+            if isinstance(entry['line'], str):
+                entry['line'] = parseLine(entry['line'])
+            # only paths from the manifest are relative to its directory:
+            for key in ('masked', 'unmasked', 'background'):
+                if row.get(key):
+                    entry[key] = os.path.join(root, row[key])
+            entries.append(entry)
+        return entries
+
+    if os.path.isdir(source):
+        paths = [os.path.join(source, p) for p in os.listdir(source)
+                 if p.lower().endswith(IMG_EXTENSIONS)]
+    else:
+        paths = glob.glob(source)
+    # don't measure unmasked and background images:
+    exclude = [os.path.abspath(p) for p in (unmasked, background) if p]
+    return [dict(default, masked=p) for p in sorted(paths)
+            if os.path.abspath(p) not in exclude]
+
+
+def measureImages(img_masked, line, img_unmasked=None, img_bg=None, max_width=101,
+                  mask_is_dark=True, stats=None, fixture=None):
+    '''
+    measure image sharpness of one v-cut
+    line    ... v-cut is located automatically if None (see locate.locateVcut)
+    fixture ... optional fixture.VcutFixture to reuse v-cut geometry
+                (line, max_width, img_bg and mask_is_dark of the fixture are used then)
+
+    returns dict {'fres', 'std', 'angle', 'r50'}
+    '''
+    if fixture is not None:
+        r, y, angle = fixture.measure(img_masked, img_unmasked)[0]
+    else:
+        if line is None:
+            line = locateVcut(img_masked, stats=stats)
+        r, y, angle = measureVcut(img_masked, line, img_unmasked, img_bg,
+                                  max_width, mask_is_dark=mask_is_dark,
+                                  stats=stats)[0]
+    r50 = findCrossing(r, y, 0.5)
+    if np.isnan(r50):
+        raise Exception('no half contrast position found')
+    fres = resolutionFactor(r, y, angle, stats=stats)
+    return {'fres': float(fres), 'std': float(resFactor2std(fres)),
+            'angle': float(angle), 'r50': float(r50)}
+
+
+def measureFiles(entries, max_width=101, mask_is_dark=True, prefetch=4, raw=None,
+                 stats=None):
+    '''
+    measure image sharpness of all [entries] (see entriesFromSource)
+    raw ... shape, dtype, offset of raw images (see utils.imgIO.imread)
+    stats ... optional utils.stageStats.StageStats collecting time and memory
+              of all processing stages over the whole run
+    images are read in [prefetch] background threads while earlier images are measured,
+    synchronously if prefetch=0 or if stats traces memory (tracemalloc is process global,
+    decoding in other threads would be counted otherwise)
+    an error in one entry is reported in the record and doesn't stop the run
+
+    yields one record (dict with keys in FIELDS) per entry
+    '''
+    cache = {}  # unmasked and background images are usually the same for all entries
+    raw = raw or {}
+
+    def read(entry):
+        t0 = time()
+        imgs = []
+        for key in ('masked', 'unmasked', 'background'):
+            path = entry.get(key)
+            if not path:
+                imgs.append(None)
+            elif key == 'masked':
+                imgs.append(imread(path, **raw))
+            else:
+                if path not in cache:
+                    cache[path] = imread(path, **raw)
+                imgs.append(cache[path])
+        return imgs, time() - t0
+
+    def measure(entry, result):
+        # result ... function returning read(entry)
+        record = dict.fromkeys(FIELDS)
+        record['masked'] = entry['masked']
+        try:
+            (img_masked, img_unmasked, img_bg), record['t_read'] = result()
+            t0 = time()
+            record.update(measureImages(img_masked, entry.get('line'), img_unmasked, img_bg,
+                                        max_width, mask_is_dark, stats))
+            record['t_measure'] = time() - t0
+        except Exception as e:
+            record['error'] = '%s: %s' % (type(e).__name__, e)
+        return record
+
+    if prefetch <= 0 or (stats is not None and stats.memory):
+        for entry in entries:
+            yield measure(entry, lambda: read(entry))
+        return
+
+    with ThreadPoolExecutor(prefetch) as pool:
+        queue = deque()
+        entries = iter(entries)
+        for entry in entries:
+            queue.append((entry, pool.submit(read, entry)))
+            if len(queue) > prefetch:
+                break
+        while queue:
+            entry, future = queue.popleft()
+            for nxt in entries:
+                queue.append((nxt, pool.submit(read, nxt)))
+                break
+            yield measure(entry, future.result)
+
+
+def writeRecords(records, path=None):
+    '''
+    write records to [path] (.csv or .jsonl) or as jsonl to stdout if path is None
+    every record is written as soon as it is available
+    '''
+    f = sys.stdout if path is None else open(path, 'w', newline='')
+    try:
+        if path is not None and path.lower().endswith('.csv'):
+            writer = csv.DictWriter(f, FIELDS)
+            writer.writeheader()
+            write = writer.writerow
+        else:
+            write = lambda record: f.write(json.dumps(record) + '\n')
+        for record in records:
+            write(record)
+            f.flush()
+    finally:
+        if path is not None:
+            f.close()
+
+
 if __name__ == '__main__':
 
     if(len(sys.argv) == 1):
         # add args created in generate.py' to test this module
         sys.argv.append("masked.png")
         sys.argv.append(open("line.txt", 'r').read())
-        sys.argv.append('-u unmasked.png')
-        
+
     parser = argparse.ArgumentParser(description='Image sharpness (resolution factor) from masked images via v-cut method')
-    parser.add_argument('masked', type=str, help='Path to masked image')
-    parser.add_argument('line', type=str, help='Line within v-cut e.g. 10,20,100,25 for x0=10,y0=20,x1=100,y1=25')
+    parser.add_argument('masked', type=str, help='''Path to masked image.
+    For batch mode: directory, glob pattern (e.g. "imgs/*.png") or manifest file (.csv/.jsonl)
+    with columns masked,line,unmasked,background''')
+    parser.add_argument('line', type=str, nargs='?', default=None,
+                        help='Line within v-cut e.g. 10,20,100,25 for x0=10,y0=20,x1=100,y1=25. Located automatically if not given')
 
     parser.add_argument('-u', '--unmasked', type=str, default=None, help='Path to unmasked image')
     parser.add_argument('-b', '--background', type=str, default=None, help='Path to background image')
     parser.add_argument('-w', '--max_width', type=int, default=101, help='Maximum width [px] of v=cut')
-    
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='Batch mode: write results to .csv or .jsonl file instead of stdout')
+    parser.add_argument('--prefetch', type=int, default=4,
+                        help='Batch mode: number of images read in advance, 0: read synchronously')
+    parser.add_argument('--stats', action='store_true',
+                        help='Batch mode: print time histograms of all processing stages to stderr')
+    parser.add_argument('--stats_memory', action='store_true',
+                        help='Batch mode: same as --stats with memory histograms '
+                             '(slower, images are read synchronously)')
+    parser.add_argument('--raw_shape', type=str, default=None,
+                        help='Raw sensor dumps: image shape as height,width e.g. 4000,6000')
+    parser.add_argument('--raw_dtype', type=str, default='uint16',
+                        help='Raw sensor dumps: pixel type')
+    parser.add_argument('--raw_offset', type=int, default=0,
+                        help='Raw sensor dumps: header size [bytes]')
+
     parser.add_argument('--mask_not_dark', dest='mask_is_dark', action='store_false', help='use flag, if mask if not completely opaque')
     parser.set_defaults(mask_is_dark=True)
-    
+
     args = parser.parse_args()
-    
-    try:
-        line = args.line.split(',')
-        if(len(line) != 4):
-            raise Exception()
-        line = [float(l) for l in line]
-    except:
-        raise Exception("need to write line as x0,y0,x1,y1  e.g.: 10,20,100,25")
-    
-    img_masked = cv2.imread(args.masked, cv2.IMREAD_GRAYSCALE)
-    
+
+    line = args.line
+    if line is not None:
+        line = parseLine(line)
+
+    raw = {}
+    if args.raw_shape is not None:
+        raw = {'shape': [int(s) for s in args.raw_shape.split(',')],
+               'dtype': args.raw_dtype, 'offset': args.raw_offset}
+
+    if isBatchSource(args.masked):
+        entries = entriesFromSource(args.masked, line, args.unmasked, args.background)
+        stats = None
+        if args.stats or args.stats_memory:
+            stats = StageStats(memory=args.stats_memory)
+        writeRecords(measureFiles(entries, args.max_width, args.mask_is_dark, args.prefetch, raw,
+                                  stats), args.output)
+        if stats is not None:
+            stats.report(sys.stderr)
+        sys.exit()
+
+    # images are read at native bit depth, memory mapped if possible:
+    img_masked = imread(args.masked, **raw)
+
     img_unmasked = args.unmasked
     if(img_unmasked != None):
-        img_unmasked = cv2.imread(img_unmasked, cv2.IMREAD_GRAYSCALE)
+        img_unmasked = imread(img_unmasked, **raw)
 
     img_bg = args.background
     if(img_bg != None):
-        img_bg = cv2.imread(img_bg, cv2.IMREAD_GRAYSCALE)
+        img_bg = imread(img_bg, **raw)
+
+    if line is None:
+        line = locateVcut(img_masked)
+        print("Located line=", ','.join('%i' % round(v) for v in line))
 
     out = measureVcut(img_masked, line, img_unmasked, img_bg,
              args.max_width, mask_is_dark=args.mask_is_dark)[0]
-    
+
     fres = resolutionFactor(*out)
     print("Resolution factor=", fres)
-    print("Corresp. std of Gaussian blur kernel=", resFactor2std(fres))    
-    
+    print("Corresp. std of Gaussian blur kernel=", resFactor2std(fres))
@@ -1,44 +1,61 @@
 import cv2
 import numpy as np
-import pylab as plt
-from scipy.signal.signaltools import convolve2d
 # local
 from utils.line import resize
-from utils.transforms import std2PSF
+from utils.blur import blur, blurGaussian, blurPSF
 
 
-def randAngle_rad(low_deg=3, high_deg=6):
+def randAngle_rad(low_deg=3, high_deg=6, rng=None):
     '''
     random angle [radians] within <low_deg>...<high_deg> [degrees]
+    rng ... np.random.Generator, use global random state if None
     '''
-    return np.random.uniform(low=np.radians(low_deg),
-                             high=np.radians(high_deg), size=(1,))[0]
+    if rng is None:
+        rng = np.random
+    return rng.uniform(low=np.radians(low_deg),
+                       high=np.radians(high_deg), size=(1,))[0]
 
 
-def patVcut(std=None, psf=None, phi=None, angle_rad=None, size=501, SNR=30):
+def patVcut(std=None, psf=None, phi=None, angle_rad=None, size=501, SNR=30,
+            rng=None):
     '''
     psf       ... blur kernel (2d numpy array)
     phi       ... rotation of v-cut (phi=0 -> v-cut opening at 3:00)
     angle_rad ... v-cut opening angle 
     size      ... output image size (x,y) [px] 
     SNR       ... signal to noise ratio
+    rng       ... np.random.Generator, use global random state if None
     '''
     assert std is not None or psf is not None, "either std or pdf have to be provided"
-    if psf is None:
-        psf = std2PSF(std)  # obtain guassian blur kernel (=point spread function [psf] from standard deviation
     
+    if rng is None:
+        rng = np.random
     if angle_rad is None:
-        angle_rad = randAngle_rad()
+        angle_rad = randAngle_rad(rng=rng)
     if phi is None:
-        phi = np.random.rand() * 2 * np.pi  # random rotation of v-cut angle
+        phi = rng.random() * 2 * np.pi  # random rotation of v-cut angle
     
-    c = size / 2
     rel_noise = 1.0 / SNR
     s = (size, size)
-    s2 = size * size
 
     img_masked = np.zeros(s)
+    line = _drawVcut(img_masked, phi, angle_rad)
+
+    # blur (separable Gaussian kernel for [std], FFT convolution for [psf]):
+    img_masked = blur(img_masked, std, psf)
+    # add noise:
+    img_masked += rng.random(s) * rel_noise
+    img_unmasked = np.ones(s) + rng.random(s) * rel_noise
+    return img_masked, img_unmasked, line
 
+
+def _drawVcut(img, phi, angle_rad):
+    '''
+    draw v-cut (value=1) into quadratic image
+    returns line indicating gap position
+    '''
+    size = img.shape[0]
+    c = size / 2
     rad = 0.5 * angle_rad
     # points of vCut:
     p0 = c + np.sin(rad + phi) * 2 * size
@@ -50,19 +67,93 @@ def patVcut(std=None, psf=None, phi=None, angle_rad=None, size=501, SNR=30):
                     (p0, p1),
                     (p2, p3)), dtype=int)
     # draw vCut:
-    cv2.fillConvexPoly(img_masked, pts,
+    cv2.fillConvexPoly(img, pts,
                        color=1,
                        lineType=0)
-
-    # blur:
-    img_masked = convolve2d(img_masked, psf, mode='same', boundary='symm')
-    # add noise:
-    img_masked += np.random.rand(s2).reshape(s) * rel_noise
-    img_unmasked = np.ones(s) + np.random.rand(s2).reshape(s) * rel_noise
     # line indicating gap position:
     line = [c, c, c + np.sin(phi) * 0.5 * size, c + np.cos(phi) * 0.5 * size]
-    line = resize(line, 1.2)
-    return img_masked, img_unmasked, line
+    return resize(line, 1.2)
+
+
+def patVcutBatch(n, std=None, psf=None, phi=None, angle_rad=None, size=501, SNR=30,
+                 dtype=np.float32, rng=None, out=None):
+    '''
+    create [n] synthetic v-cut patterns at once
+
+    std, phi, angle_rad, SNR ... either one value for all patterns or one value per pattern
+                                 phi, angle_rad are random if None (see patVcut)
+    dtype ... float type of output images
+    rng   ... np.random.Generator or seed
+              random numbers are drawn in a different order than in patVcut
+    out   ... optional preallocated (img_masked, img_unmasked) - each (>=n, size, size) of [dtype]
+
+    returns img_masked (n,size,size), img_unmasked (n,size,size), lines (n,4),
+            dict of ground truth parameters {'std', 'phi', 'angle_rad', 'SNR'} - each (n,)
+    '''
+    assert std is not None or psf is not None, "either std or pdf have to be provided"
+    rng = np.random.default_rng(rng)
+    if out is None:
+        img_masked = np.empty((n, size, size), dtype=dtype)
+        img_unmasked = np.empty_like(img_masked)
+    else:
+        img_masked, img_unmasked = out[0][:n], out[1][:n]
+        dtype = img_masked.dtype
+
+    if angle_rad is None:
+        angle_rad = rng.uniform(np.radians(3), np.radians(6), n)
+    if phi is None:
+        phi = rng.random(n) * 2 * np.pi
+    truth = {'std': std, 'phi': phi, 'angle_rad': angle_rad, 'SNR': SNR}
+    for key, val in truth.items():
+        truth[key] = np.broadcast_to(np.nan if val is None else val, (n,)).astype(float)
+    rel_noise = (1.0 / truth['SNR'])[:, np.newaxis, np.newaxis]
+
+    # noise:
+    rng.random(out=img_masked, dtype=dtype)
+    img_masked *= rel_noise
+    rng.random(out=img_unmasked, dtype=dtype)
+    img_unmasked *= rel_noise
+    img_unmasked += 1
+
+    # blurred v-cut:
+    lines = np.empty((n, 4))
+    pattern = np.empty((size, size), dtype=dtype)
+    blurred = np.empty_like(pattern)
+    for i in range(n):
+        pattern[:] = 0
+        lines[i] = _drawVcut(pattern, truth['phi'][i], truth['angle_rad'][i])
+        if psf is None:
+            blurGaussian(pattern, truth['std'][i], dst=blurred)
+        else:
+            blurred[:] = blurPSF(pattern, psf)
+        img_masked[i] += blurred
+    return img_masked, img_unmasked, lines, truth
+
+
+def iterPatVcut(n, batch_size=64, std=None, phi=None, angle_rad=None, SNR=30, size=501,
+                dtype=np.float32, rng=None, **kwargs):
+    '''
+    yield [n] synthetic v-cut patterns in batches of [batch_size]
+    as returned by patVcutBatch
+
+    std, phi, angle_rad, SNR ... one value for all patterns or one value per pattern
+                                 phi, angle_rad are random if None (see patVcutBatch)
+    kwargs ... passed to patVcutBatch
+
+    image buffers are reused for every batch:
+    copy returned images if they are needed after the next iteration
+    '''
+    rng = np.random.default_rng(rng)
+    # per pattern values are sliced for every batch:
+    params = {key: None if val is None else np.broadcast_to(val, (n,))
+              for key, val in (('std', std), ('phi', phi), ('angle_rad', angle_rad),
+                               ('SNR', SNR))}
+    out = (np.empty((batch_size, size, size), dtype=dtype),
+           np.empty((batch_size, size, size), dtype=dtype))
+    for i in range(0, n, batch_size):
+        j = min(n, i + batch_size)
+        batch = {key: None if val is None else val[i:j] for key, val in params.items()}
+        yield patVcutBatch(j - i, size=size, rng=rng, out=out, **dict(kwargs, **batch))
 
 
 def patSiemensStar(s0, n=72, vhigh=255, vlow=0, antiasing=False):
@@ -99,6 +190,7 @@ def patSiemensStar(s0, n=72, vhigh=255, vlow=0, antiasing=False):
 
 
 def plotVcut(title, img_masked, img_unmasked, line):
+    import pylab as plt
     f, (a0, a1) = plt.subplots(2)
     f.canvas.set_window_title(title)
     a0.set_title('masked')
@@ -111,6 +203,7 @@ def plotVcut(title, img_masked, img_unmasked, line):
 
 
 if __name__ == '__main__':
+    import pylab as plt
     # generate and plot 4 synthetic v-cut images with different image sharpness
     for std in np.linspace(1.5, 4.5, 3):
         print(std)
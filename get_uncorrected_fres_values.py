@@ -1,50 +1,57 @@
 '''
 in order to obtain empirical resolution factor coeff. calc. uncorrected resolution factor
 for various input std
-printed result can then be used in get_fres_coeffs.py
+results are stored in the calibration store (utils/calibration.py) and used in get_fres_coeffs.py
 
 '''
 
 import numpy as np
-import pylab as plt
 
 # local
-from generate import patVcut
-from measure import measureVcut
+from sweep import sweep, uncorrectedResolutionFactor
+from utils.calibration import CalibrationStore, DEFAULT_PARAMS
 
-from utils.findXAt import findXAt
 
+def patternKwargs(params):
+    '''
+    keyword arguments of sweep.uncorrectedResolutionFactor for v-cut generator [params]
+    (see utils.calibration.DEFAULT_PARAMS['vcut'])
+    '''
+    if params['noise'] != 'uniform':
+        raise ValueError("only uniform noise is supported by generate.patVcut")
+    return {'size': params['size'], 'SNR': params['SNR'], 'angle_deg': params['angle_deg']}
 
-def main():
-    X = []  # input image sharpness (standard deviation)
-    Y = []  # uncorrected resolution factor
-    Ys = []  # std for Y
-    
-    for std in np.linspace(0.5, 5, 40):  # for variable image sharpness expressed as standard deviation of gaussian blur kernel
-        yi = []
-        for _ in range(20):  # repeat every measurement 10 times
-
-            # synth. measurement pattern:
-            img_masked, img_unmasked, line = patVcut(std)
-            # get image contrast along middle line:
-            r, y, calc_angle = measureVcut(img_masked, line=line, img_unmasked=img_unmasked)[0]
-            
-            # uncorrected resolution factor:
-            r50 = findXAt(r, y, 0.5) 
-            yi.append(calc_angle * r50)
-            
-        if(len(yi)):
-            X.append(std)
-            ym = np.mean(yi)
-            ys = np.std(yi)
-    
-            Ys.append(np.std(yi))
-            Y.append(ym)
+
+def uncorrectedValues(stds, n_repeat=20, params=None, seed=0, n_workers=None, store=None):
+    '''
+    uncorrected resolution factors (len(stds), n_repeat) of synthetic v-cuts
+    created with generator [params] (default: utils.calibration.DEFAULT_PARAMS['vcut'])
+
+    values are taken from calibration [store], only missing ones are measured and added
+    (call store.save() to write them to disk)
+    '''
+    params = DEFAULT_PARAMS['vcut'] if params is None else params
+    store = CalibrationStore() if store is None else store
+    compute = lambda missing: sweep(uncorrectedResolutionFactor, missing, n_repeat, seed,
+                                    n_workers, seed_per_std=True,
+                                    **patternKwargs(params)).tolist()
+    return np.array(store.points('vcut', params, 'uncorrected(seed=%i)' % seed,
+                                 stds, compute, n_repeat))
+
+
+def main(n_workers=None, seed=0, params=None):
+    import pylab as plt
+    X = np.linspace(0.5, 5, 40)  # for variable image sharpness expressed as standard deviation of gaussian blur kernel
+    # uncorrected resolution factor, repeat every measurement 20 times:
+    store = CalibrationStore()
+    yi = uncorrectedValues(X, 20, params, seed, n_workers, store)
+    store.save()
+    Y = yi.mean(axis=1)
+    Ys = yi.std(axis=1)  # std for Y
+    X = list(X)
 
     print("stds=", X)  # use those values for resolution factor correction
-    print('fres0=', Y)
-    Y = np.array(Y)
-    ys = np.array(ys)
+    print('fres0=', list(Y))
 
     # 1 to 1 relation
     plt.plot([0, max(X)], [0, max(X)], c='k')
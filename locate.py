@@ -0,0 +1,275 @@
+'''
+automatic v-cut localization: find the line needed by measure.measureVcut
+
+1. the image is downsampled once to [coarse_size] px,
+   both v-cut edges are found as the strongest pair of straight lines with a small
+   opening angle (Canny edges + Hough transform)
+2. the edges are refined level by level (factor 2) up to full resolution,
+   only a window around the v-cut tip is resampled at every level
+
+apart from the single downsampling of the whole image, the cost doesn't depend
+on the image size.
+'''
+
+import cv2
+import numpy as np
+from scipy.ndimage import map_coordinates
+
+# local
+from utils.stageStats import stages
+
+
+def locateVcut(img_masked, coarse_size=512, length=400, band=3,
+               min_angle_deg=0.5, max_angle_deg=20, max_iter=10, stats=None):
+    '''
+    img_masked    ... image with v-cut mask (any dtype, 2d)
+    coarse_size   ... size [px] of the longer image side at the coarsest level
+    length        ... maximum length [px] of returned line (full resolution)
+                      the half contrast position is close to the v-cut tip,
+                      so a fixed length keeps measureVcut cost independent of image size
+    band          ... maximum distance [px] of edge pixels to an edge during refinement
+    min_angle_deg, max_angle_deg ... range of v-cut opening angle
+    max_iter      ... maximum number of refinement steps
+    stats         ... see measure.measureVcut
+
+    returns line (x0,y0,x1,y1) from behind the v-cut tip into the gap (same as generate.patVcut)
+    '''
+    stage = stages(stats)
+    s0, s1 = img_masked.shape
+    scale = min(1.0, coarse_size / max(s0, s1))
+
+    with stage('coarse'):
+        if scale < 1:
+            coarse = cv2.resize(img_masked, None, fx=scale, fy=scale,
+                                interpolation=cv2.INTER_AREA)
+        else:
+            coarse = img_masked
+        edges, _mag, dx, dy = _edgeImage(coarse)
+        pts = np.argwhere(edges)[:, ::-1].astype(float)
+        grad = np.stack((dx[edges > 0], dy[edges > 0]), axis=1)
+        line1, line3 = _houghPair(edges, pts, grad,
+                                  np.radians(min_angle_deg), np.radians(max_angle_deg))
+        tip, direction, extent = _wedge(line1, line3, pts, band)
+
+    with stage('refine'):
+        extent = min(extent / scale, length)
+        tip = tip / scale
+        line1 = (line1[0], line1[1] / scale)
+        line3 = (line3[0], line3[1] / scale)
+        for _ in range(max_iter):
+            # double resolution, until full resolution is reached,
+            # then iterate until the tip doesn't move anymore:
+            scale = min(1.0, 2 * scale)
+            line1, line3 = _refine(img_masked, line1, line3, tip, direction, extent,
+                                   scale, band)
+            tip0 = tip
+            tip, direction = _tipDirection(line1, line3, direction)
+            if scale == 1 and np.linalg.norm(tip - tip0) < 0.5:
+                break
+
+    x0, y0 = tip - 0.1 * extent * direction
+    x1, y1 = tip + extent * direction
+    return float(x0), float(y0), float(x1), float(y1)
+
+
+def _edgeImage(img):
+    '''
+    Canny edges, threshold above noise (median gradient) and relative to strongest edges
+    returns edges, gradient magnitude, x and y gradient
+    '''
+    img = cv2.GaussianBlur(img.astype(np.float32), (5, 5), 0)
+    dx = cv2.Sobel(img, cv2.CV_32F, 1, 0, ksize=3)
+    dy = cv2.Sobel(img, cv2.CV_32F, 0, 1, ksize=3)
+    mag = cv2.magnitude(dx, dy)
+    median, strong = np.percentile(mag, (50, 99.9))
+    high = max(6 * median, 0.3 * strong)
+    if high == 0:
+        raise Exception('no v-cut found - image has no contrast')
+    # Canny needs int16 gradients:
+    f = 32000 / mag.max()
+    edges = cv2.Canny((dx * f).astype(np.int16), (dy * f).astype(np.int16),
+                      0.5 * high * f, high * f, L2gradient=True)
+    return edges, mag, dx, dy
+
+
+def _houghPair(edges, pts, grad, min_angle, max_angle):
+    '''
+    strongest pair of Hough lines enclosing an angle within [min_angle, max_angle]
+    with opposite edge polarity (otherwise both lines can belong to the same thick edge)
+    pts, grad ... (N,2) x,y and gradient of edge pixels
+
+    returns both lines as (unit normal, offset)
+    '''
+    lines = cv2.HoughLines(edges, 1, np.pi / 720, max(10, int(0.05 * max(edges.shape))))
+    if lines is None:
+        raise Exception('no v-cut found')
+    lines = [_lineNormal(rho, theta) for rho, theta in lines[:, 0]]
+    polarity = {}
+
+    def getPolarity(i):
+        # mean gradient across line i
+        if i not in polarity:
+            n, c = lines[i]
+            near = np.abs(pts @ n - c) <= 1.5
+            polarity[i] = np.sign((grad[near] @ n).sum())
+        return polarity[i]
+
+    normals = np.array([n for n, _c in lines])
+    # lines are sorted by votes:
+    for i, (n1, _c1) in enumerate(lines):
+        cos = normals[i + 1:] @ n1
+        d = np.arccos(np.abs(cos).clip(0, 1))
+        for j in np.flatnonzero((d >= min_angle) & (d <= max_angle)) + i + 1:
+            # polarity with respect to the same normal direction:
+            if getPolarity(i) * getPolarity(j) * np.sign(cos[j - i - 1]) < 0:
+                return lines[i], lines[j]
+    raise Exception('no v-cut found - no pair of edges with matching angle')
+
+
+def _lineNormal(rho, theta):
+    # line as (unit normal, offset): normal . p = offset
+    return np.array((np.cos(theta), np.sin(theta))), float(rho)
+
+
+def _tipDirection(line1, line3, direction):
+    '''
+    intersection of both edges and unit vector along the bisector pointing into the gap
+    ([direction] ... approximate direction)
+    '''
+    (n1, c1), (n3, c3) = line1, line3
+    a = np.array((n1, n3))
+    if abs(np.linalg.det(a)) < 1e-6:
+        raise Exception('no v-cut found - edges are parallel')
+    tip = np.linalg.solve(a, (c1, c3))
+    # edge directions, both pointing into the gap:
+    u1 = np.array((-n1[1], n1[0]))
+    u3 = np.array((-n3[1], n3[0]))
+    u1 *= np.sign(u1 @ direction)
+    u3 *= np.sign(u3 @ direction)
+    bisector = u1 + u3
+    return tip, bisector / np.linalg.norm(bisector)
+
+
+def _wedge(line1, line3, pts, band):
+    '''
+    tip, direction into the gap and length of visible v-cut edges
+    pts ... (N,2) x,y of edge pixels
+    '''
+    tip, direction = _tipDirection(line1, line3, np.array(line1[0][::-1]) * (1, -1))
+    near = np.zeros(len(pts), dtype=bool)
+    for n, c in (line1, line3):
+        near |= np.abs(pts @ n - c) <= band
+    if near.sum() < 10:
+        raise Exception('no v-cut found')
+    proj = (pts[near] - tip) @ direction
+    if np.median(proj) < 0:
+        # edges are on the other side of the tip:
+        direction = -direction
+        proj = -proj
+    return tip, direction, float(np.percentile(proj, 95))
+
+
+def _refine(img, line1, line3, tip, direction, extent, scale, band):
+    '''
+    fit both edges (full resolution coordinates) to Canny edges within [band]
+    around given edges, 50...100% of [extent] in front of the tip
+    only the window around the v-cut is resampled at [scale]
+    '''
+    s0, s1 = img.shape
+    # window containing the line from behind the tip into the gap:
+    ends = np.array((tip - 0.1 * extent * direction, tip + extent * direction))
+    normal = np.array((-direction[1], direction[0]))
+    half_width = abs((ends[1] - tip) @ np.array(line1[0])) + abs(
+        (ends[1] - tip) @ np.array(line3[0])) + 2 * band / scale
+    corners = np.concatenate((ends + half_width * normal, ends - half_width * normal))
+    x0, y0 = np.clip(np.floor(corners.min(axis=0)).astype(int), 0, None)
+    x1, y1 = np.ceil(corners.max(axis=0)).astype(int) + 1
+    x1, y1 = min(x1, s1), min(y1, s0)
+    crop = img[y0:y1, x0:x1]
+    if crop.shape[0] < 8 or crop.shape[1] < 8:
+        raise Exception('no v-cut found - v-cut is outside of image')
+    if scale < 1:
+        crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    edges, mag = _edgeImage(crop)[:2]
+    # edge pixels in crop and in full resolution coordinates:
+    q = np.argwhere(edges)[:, ::-1].astype(float)
+    pts = (q + 0.5) / scale - 0.5 + (x0, y0)
+    # blur merges both edges close to the tip and moves the intersection behind the tip,
+    # so only use edges where the gap is wider:
+    proj = (pts - tip) @ direction
+    inside = (proj > 0.5 * extent) & (proj < extent)
+    q, pts = q[inside], pts[inside]
+
+    out = []
+    for n, c in (line1, line3):
+        near = np.abs(pts @ n - c) <= band / scale
+        if near.sum() < 10:
+            raise Exception('no v-cut found - edge lost during refinement')
+        # sub-pixel position: parabola through gradient magnitude along edge normal
+        # (the tip moves ~ edge shift / tan(opening angle/2), so pixel positions are too coarse)
+        qn = q[near]
+        m0, m1, m2 = (map_coordinates(mag, (qn + k * np.asarray(n)).T[::-1], order=1)
+                      for k in (-1, 0, 1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.nan_to_num(0.5 * (m0 - m2) / (m0 - 2 * m1 + m2)).clip(-0.5, 0.5)
+        out.append(_fitLine(pts[near] + (t / scale)[:, np.newaxis] * n))
+    return out
+
+
+def _fitLine(pts):
+    '''
+    total least squares line (unit normal, offset) through points (N,2)
+    '''
+    mean = pts.mean(axis=0)
+    # normal is eigenvector of smallest eigenvalue:
+    normal = np.linalg.eigh(np.cov((pts - mean).T))[1][:, 0]
+    return normal, float(normal @ mean)
+
+
+if __name__ == '__main__':
+    from time import perf_counter
+
+    from generate import patVcut
+    from measure import measureVcut
+    from resolutionFactor import resolutionFactor
+    from utils.stageStats import StageStats
+
+    rng = np.random.default_rng(0)
+
+    def fres(img_masked, line, img_unmasked):
+        return resolutionFactor(*measureVcut(img_masked, line, img_unmasked)[0])
+
+    # compare with line of same length at the true v-cut position
+    # (the drawn v-cut is ~1px wider than nominal, so its visible tip is ~10px behind center)
+    print('%10s %4s %8s %8s %8s %8s %9s %9s' % ('image', 'std', 'tip[px]', 'dir[deg]',
+                                                'fres', 'located', 'time[ms]', 'coarse[ms]'))
+    for size in (501, 2001, 5001):
+        for std in (1, 1.5, 3):
+            phi = rng.random() * 2 * np.pi
+            img_masked, img_unmasked, _line = patVcut(std, phi=phi, size=size, rng=rng)
+            stats = StageStats()
+            t0 = perf_counter()
+            located = locateVcut(img_masked, stats=stats)
+            t = perf_counter() - t0
+
+            p0, p1 = np.array(located[:2]), np.array(located[2:])
+            length = np.linalg.norm(p1 - p0) / 1.1
+            direction = (p1 - p0) / (1.1 * length)
+            tip = p0 + 0.1 * length * direction
+            true_tip = np.full(2, int(size / 2))
+            true_direction = np.array((np.sin(phi), np.cos(phi)))
+            true_line = tuple(true_tip - 0.1 * length * true_direction) + tuple(
+                true_tip + length * true_direction)
+            print('%10s %4.1f %8.1f %8.2f %8.3f %8.3f %9.1f %9.1f' % (
+                '%ix%i' % (size, size), std, np.linalg.norm(tip - true_tip),
+                np.degrees(np.arccos(min(1, direction @ true_direction))),
+                fres(img_masked, true_line, img_unmasked),
+                fres(img_masked, located, img_unmasked),
+                1e3 * t, 1e3 * stats.last['coarse'][0]))
+
+    import os
+    path = os.path.dirname(os.path.abspath(__file__))
+    img = cv2.imread(os.path.join(path, 'masked.png'), cv2.IMREAD_GRAYSCALE)
+    with open(os.path.join(path, 'line.txt')) as f:
+        print('masked.png: line.txt %s, located %s' % (
+            f.read().strip(), '%i,%i,%i,%i' % locateVcut(img)))
@@ -1,18 +1,24 @@
 import cv2
 import numpy as np
-from scipy.ndimage.interpolation import map_coordinates
+from scipy.ndimage import map_coordinates, spline_filter, spline_filter1d
 
 # local
-from utils.line import angle2, fromFn, intersection, cutToFitIntoPolygon
-from utils.alignImageAlongLine import alignImageAlongLine
-from utils.robustLinregress import robustLinregress
+from utils.line import angle2, fromFn, intersection, cutToFitIntoPolygon, clipLines
+import utils.line as ln
+from utils.alignImageAlongLine import alignImageAlongLine, alignTransform, alignBoundingBox
+from utils.robustLinregress import robustLinregressStack
 from utils.findXAt import findXAt
+from utils.stageStats import stages
 
 
 def measureVcut(img_masked, line, img_unmasked=None, img_bg=None,
              max_width=101,
              mask_is_dark=False,
-             v_isDark=None):
+             v_isDark=None,
+             stats=None,
+             n_rays=1,
+             ray_spread=0.2,
+             dtype=float):
     '''
     img_masked   ... image with v-cut mask
     img_unmasked ... image without v-cut mask
@@ -23,34 +29,103 @@ def measureVcut(img_masked, line, img_unmasked=None, img_bg=None,
   
     v_isDark - whether v-cut mask is dark - if None, value is determined from image intensities at line start/end
     mask_is_dark - whether mask used to build V is absolutely dark (0) 
+    stats - optional utils.stageStats.StageStats to record time and memory of every stage
+    n_rays - average the contrast profile of a fan of rays around the middle line
+             within [ray_spread] of the v-cut opening (see sampleRays)
+             less noise than the middle line (n_rays=1) from the same image
+    dtype - compute dtype of warp, contrast image, Sobel and profile sampling
+            np.float32 halves memory traffic (see README for accuracy)
+
+    only the image region needed to align the v-cut is converted to [dtype]
+    '''
+    stage = stages(stats)
+    with stage('crop'):
+        s0, s1 = img_masked.shape
+        poly = ((0, 0), (s1, 0), (s1, s0), (0, s0), (0, 0))
+        line = cutToFitIntoPolygon(line, poly)
+        # crop images to region around v-cut:
+        x0, y0, x1, y1 = alignBoundingBox(line, max_width, shape=(s0, s1))
+        window = slice(y0, y1), slice(x0, x1)
+        img_masked = img_masked[window]
+        if img_unmasked is not None:
+            img_unmasked = img_unmasked[window]
+        if np.ndim(img_bg):
+            img_bg = img_bg[window]
+        line = (line[0] - x0, line[1] - y0, line[2] - x0, line[3] - y0)
+
+    with stage('preprocess'):
+        img_masked, img_unmasked = preprocess(img_masked, img_unmasked, img_bg, dtype)
+    return measurePreprocessed(img_masked, line, img_unmasked,
+                               max_width, mask_is_dark, v_isDark, stats, n_rays, ray_spread)
+
+
+def preprocess(img_masked, img_unmasked=None, img_bg=None, dtype=float):
+    '''
+    convert images to float ([dtype]) and subtract background
+    this only needs to be done once if several v-cuts are measured in the same image
     '''
-    
     if img_unmasked is not None:
-        img_unmasked = img_unmasked.astype(float)
+        img_unmasked = img_unmasked.astype(dtype)
         
-    img_masked = img_masked.astype(float)
+    img_masked = img_masked.astype(dtype)
    
     if img_bg is not None:
-        img_unmasked = img_unmasked - img_bg
-        img_masked = img_masked - img_bg
-      
-    s0, s1 = img_masked.shape
-    poly = ((0, 0), (s1, 0), (s1, s0), (0, s0), (0, 0))
-    line = cutToFitIntoPolygon(line, poly)
-    # rectify image to given line: (this is not necassarily precise)
-    if img_unmasked is not None:
-        sub_img_unmasked = alignImageAlongLine(img_unmasked, line, max_width)
-    sub_img_masked = alignImageAlongLine(img_masked, line, max_width)
+        if img_unmasked is not None:
+            img_unmasked -= img_bg
+        img_masked -= img_bg
+    return img_masked, img_unmasked
+
+
+def measurePreprocessed(img_masked, line, img_unmasked=None,
+                        max_width=101,
+                        mask_is_dark=False,
+                        v_isDark=None,
+                        stats=None,
+                        n_rays=1,
+                        ray_spread=0.2):
+    '''
+    same as measureVcut for images returned by preprocess()
+    computation is done in dtype of images
+    '''
+    stage = stages(stats)
+    with stage('align'):
+        s0, s1 = img_masked.shape
+        poly = ((0, 0), (s1, 0), (s1, s0), (0, s0), (0, 0))
+        line = cutToFitIntoPolygon(line, poly)
+        # rectify image to given line: (this is not necassarily precise)
+        sub_img_unmasked = None
+        if img_unmasked is not None:
+            sub_img_unmasked = alignImageAlongLine(img_unmasked, line, max_width)
+        sub_img_masked = alignImageAlongLine(img_masked, line, max_width)
+
+    with stage('contrast'):
+        contrast_img = contrastImage(sub_img_masked, sub_img_unmasked,
+                                     mask_is_dark, v_isDark)[0]
+    (m1, n1, m3, n3), dsub = fitVcut(contrast_img, stats)
+    vals, fitlines = vcutProfile(contrast_img, m1, n1, m3, n3,
+                                 normalize=img_unmasked is None, stats=stats,
+                                 n_rays=n_rays, ray_spread=ray_spread)
+    return vals, fitlines, (contrast_img, dsub)
+
+
+def contrastImage(sub_img_masked, sub_img_unmasked=None,
+                  mask_is_dark=False, v_isDark=None):
+    '''
+    create 0...1 scaled contrast image from aligned sub images
+    (see alignImageAlongLine)
+    sub images are modified in place
 
+    returns contrast_img, v_isDark
+    '''
     if not mask_is_dark:
         # assume mtf being 0 at given end value
         offs = sub_img_masked[-1].mean()
         sub_img_masked -= offs
-        if img_unmasked is not None:
+        if sub_img_unmasked is not None:
             sub_img_unmasked -= offs
     
     # create 0...1 scaled contrast image:
-    if img_unmasked is None:
+    if sub_img_unmasked is None:
         contrast_img = sub_img_masked
     else:
         # make relative
@@ -59,36 +134,73 @@ def measureVcut(img_masked, line, img_unmasked=None, img_bg=None,
     if v_isDark is None:
         # determine whether vmask is dark from eval sub_img_masked intensities at x=0
         # if mid brighter than corner:
-        if contrast_img[contrast_img.shape[0] // 2].mean() > contrast_img[0].mean():
-            v_isDark = True
+        v_isDark = contrast_img[contrast_img.shape[0] // 2].mean() > contrast_img[0].mean()
 
     if not v_isDark:
         contrast_img = 1 - contrast_img
+    return contrast_img, v_isDark
 
-    s0, s1 = contrast_img.shape
-    x = np.arange(s1, dtype=int)
 
-    dsub = cv2.Sobel(contrast_img, cv2.CV_64F, 0, 1, ksize=5)
+def fitVcut(contrast_img, stats=None):
+    '''
+    detect both v-cut edges in contrast image and fit them with straight lines
+    stats ... see measureVcut
+
+    returns (m1, n1, m3, n3) ... ascent and offset of upper and lower edge, 
+            sobel image
+    '''
+    stage = stages(stats)
+
+    with stage('sobel'):
+        dsub = cv2.Sobel(contrast_img, _cvDepth(contrast_img.dtype), 0, 1, ksize=5)
   
+    with stage('edges'):
+        xx, line1, line3 = vcutEdges(contrast_img, dsub)
+
+    with stage('regression'):
+        # FIT LINEAR LINES: (upper and lower edge at once)
+        (m1, m3), (n1, n3) = robustLinregressStack(xx, np.array((line1, line3)))
+    return (m1, n1, m3, n3), dsub
+
+
+def _cvDepth(dtype):
+    # opencv output depth keeping float32, float64 otherwise
+    return cv2.CV_32F if dtype == np.float32 else cv2.CV_64F
+
+
+def vcutEdges(contrast_img, dsub):
+    '''
+    position of upper and lower v-cut edge in every column of contrast image
+    until the v-cut ends
+    dsub ... sobel image of contrast image (see fitVcut)
+
+    returns columns, upper edge, lower edge
+    '''
+    x = np.arange(contrast_img.shape[1], dtype=int)
     # FIND LINES: (precise)
     line1 = np.argmin(dsub, axis=0)
     line3 = np.argmax(dsub, axis=0)
     line2 = 0.5 * (line1 + line3)
 
-    xx = x
     # find out where V ends:
     i = np.argmax(contrast_img[line2.round().astype(int), x] < 0.22)
     if i:
-        s1 = i
-        xx = x[:i]
-        line1 = line1[:i]
-        line2 = line2[:i]
-        line3 = line3[:i]
+        return x[:i], line1[:i], line3[:i]
+    return x, line1, line3
 
-    # FIT LINEAR LINES:
-    m1, n1 = robustLinregress(xx, line1)[:2]  # upper edge
-    m3, n3 = robustLinregress(xx, line3)[:2]  # lower edge
 
+def vcutProfile(contrast_img, m1, n1, m3, n3, normalize=False, stats=None,
+                n_rays=1, ray_spread=0.2, combine='mean'):
+    '''
+    sample contrast image along middle line of fitted v-cut edges (see fitVcut)
+    normalize ... scale contrast 0...1 (needed if there is no unmasked image)
+    stats ... see measureVcut
+    n_rays, ray_spread, combine ... see sampleRays
+
+    returns (radii, contrasts, angle), (fitline1, fitline2, fitline3)
+    '''
+    stage = stages(stats)
+    x = np.arange(contrast_img.shape[1], dtype=int)
     l1 = fromFn(m1, n1)
     l3 = fromFn(m3, n3)
 
@@ -96,7 +208,11 @@ def measureVcut(img_masked, line, img_unmasked=None, img_bg=None,
     fitline1 = x * m1 + n1  # REMOVE NOT NEEDED
     fitline3 = x * m3 + n3  # R..
     fitline2 = 0.5 * (fitline1 + fitline3)  # middle line
-    y = map_coordinates(contrast_img, [fitline2, x], order=2)
+    if n_rays == 1:
+        with stage('profile'):
+            # spline coefficients in dtype of contrast image (map_coordinates uses float64):
+            coeffs = spline_filter(contrast_img, 2, output=contrast_img.dtype, mode='constant')
+            y = map_coordinates(coeffs, [fitline2, x], order=2, prefilter=False)
 
     try:
         # Intersection of detected v-cut lines:
@@ -105,7 +221,7 @@ def measureVcut(img_masked, line, img_unmasked=None, img_bg=None,
         raise Exception('no intersection found')
     # Angle of intersection:
     angle = abs(angle2(l1, l3))
-    dx = np.asfarray(x) - i0
+    dx = x - i0
     dy = fitline2 - i1
     # radii from intersection:
     r = np.hypot(dx, dy)  
@@ -125,27 +241,300 @@ def measureVcut(img_masked, line, img_unmasked=None, img_bg=None,
 #         plt.show()
         
         r = r[behind_intersection:]
-        y = y[behind_intersection:]
+        if n_rays == 1:
+            y = y[behind_intersection:]
 
-    if img_unmasked is None:
+    if n_rays > 1:
+        with stage('profile'):
+            y = sampleRays(contrast_img, i0, i1, m1, m3, r, n_rays, ray_spread, combine)
+
+    if normalize:
         # only one masked image avail. normalize y 0...1:
-        mx = y.max()
-        mn = y.min()
-        mean = y.mean()
-        t0 = 0.7 * mx - 0.3 * mean
-        t1 = 0.7 * mn + 0.3 * mean
-        low = np.median(y[y < t1])
-        high = np.median(y[y > t0])
-        y -= low
-        y /= (high - low)
-
-    return (r, y, angle), (fitline1, fitline2, fitline3), (contrast_img, dsub)
+        normalizeProfile(y)
+
+    return (r, y, angle), (fitline1, fitline2, fitline3)
+
+
+def sampleRays(contrast_img, i0, i1, m1, m3, radii, n_rays=5, spread=0.2, combine='mean'):
+    '''
+    contrast profile at [radii] from v-cut intersection (i0,i1), combined from a fan of rays
+    all rays are sampled in one map_coordinates call (polar resampling)
+
+    m1, m3 ... ascent of upper and lower v-cut edge
+    n_rays ... number of rays
+    spread ... rays are placed within this fraction of the v-cut opening around the middle line
+               contrast decreases towards the edges, so wide fans underestimate contrast
+    combine ... 'mean' or 'median' of all rays
+
+    returns contrasts (same length as radii)
+    '''
+    # ascent of rays, middle ray is the middle line:
+    t = 0.5 + spread * np.linspace(-0.5, 0.5, n_rays)
+    m = (m1 + t * (m3 - m1))[:, np.newaxis]
+    # v-cut opens towards increasing x:
+    xx = i0 + radii / np.hypot(1, m)
+    yy = i1 + m * (xx - i0)
+    # rays are between the v-cut edges, only the last radii of outer rays
+    # can be slightly outside the image:
+    y = map_coordinates(contrast_img, [yy, xx], order=2, mode='nearest')
+    if combine == 'mean':
+        return y.mean(axis=0)
+    if combine == 'median':
+        return np.median(y, axis=0)
+    raise ValueError("combine has to be 'mean' or 'median'")
+
+
+def normalizeProfile(y):
+    '''
+    scale contrast profile [y] 0...1 in place
+    '''
+    mx = y.max()
+    mn = y.min()
+    mean = y.mean()
+    t0 = 0.7 * mx - 0.3 * mean
+    t1 = 0.7 * mn + 0.3 * mean
+    low = np.median(y[y < t1])
+    high = np.median(y[y > t0])
+    y -= low
+    y /= (high - low)
+    return y
+
+
+def normalizeProfiles(y):
+    '''
+    same as normalizeProfile for every row in y (N,width) in place
+    y can contain NaN
+    '''
+    mx = np.nanmax(y, axis=1)
+    mn = np.nanmin(y, axis=1)
+    mean = np.nanmean(y, axis=1)
+    t0 = (0.7 * mx - 0.3 * mean)[:, np.newaxis]
+    t1 = (0.7 * mn + 0.3 * mean)[:, np.newaxis]
+    with np.errstate(invalid='ignore'):
+        low = np.nanmedian(np.where(y < t1, y, np.nan), axis=1)
+        high = np.nanmedian(np.where(y > t0, y, np.nan), axis=1)
+    y -= low[:, np.newaxis]
+    y /= (high - low)[:, np.newaxis]
+    return y
+
+
+def _mirrorTail(stack, lengths):
+    '''
+    replace the columns behind [lengths] of every image in stack (N,height,width) in place
+    by mirrored columns, so that the Sobel kernel sees the same border as for a single image
+    '''
+    x = np.arange(stack.shape[2])
+    for img, l in zip(stack, lengths):
+        if l < len(x):
+            img[:, l:] = img[:, (2 * (l - 1) - x[l:]).clip(0)]
+
+
+def _sobelStack(stack):
+    '''
+    cv2.Sobel(dy=1, ksize=5) for every image in stack (N,height,width)
+    done in one call by placing all images side by side
+    '''
+    n, s0, s1 = stack.shape
+    # pad every image with 2 columns, so that kernel doesn't touch neighbours:
+    padded = np.pad(stack, ((0, 0), (0, 0), (2, 2)), mode='reflect')
+    flat = np.ascontiguousarray(padded.transpose(1, 0, 2)).reshape(s0, -1)
+    d = cv2.Sobel(flat, _cvDepth(flat.dtype), 0, 1, ksize=5)
+    return d.reshape(s0, n, s1 + 4)[:, :, 2:-2].transpose(1, 0, 2)
+
+
+def sampleColumns(stack, ypos, order=2, margin=20):
+    '''
+    spline interpolated values of every column x in stack(N,height,width) at [ypos](N,width)
+    same as map_coordinates(img, [ypos, x], order=2) for every image
+
+    spline coefficients are only calculated within a band of [margin] px around [ypos],
+    (influence of more distant values is negligible)
+    '''
+    n, s0, s1 = stack.shape
+    lo = max(0, int(np.floor(ypos.min())) - margin)
+    hi = min(s0, int(np.ceil(ypos.max())) + margin + 1)
+    if lo == 0 or hi == s0:
+        # band touches image border: border handling needs the full column
+        lo, hi = 0, s0
+    coeffs = spline_filter1d(stack[:, lo:hi], order, axis=1, output=stack.dtype)
+    s0 = hi - lo
+    c = np.floor(ypos + 0.5).astype(int) - lo
+    t = ypos - lo - c
+    # quadratic b-spline weights:
+    weights = (0.5 * (0.5 - t) ** 2, 0.75 - t ** 2, 0.5 * (0.5 + t) ** 2)
+    ii = np.arange(n)[:, np.newaxis]
+    x = np.arange(s1)
+    y = 0
+    for offs, w in zip((-1, 0, 1), weights):
+        # mirror at image border:
+        yi = np.abs(c + offs)
+        yi = np.where(yi > s0 - 1, 2 * (s0 - 1) - yi, yi).clip(0, s0 - 1)
+        y = y + w * coeffs[ii, yi, x]
+    return y
+
+
+def measureVcutStack(imgs_masked, lines, imgs_unmasked=None, img_bg=None,
+             max_width=101,
+             mask_is_dark=False,
+             v_isDark=None,
+             dtype=float):
+    '''
+    same as measureVcut, but for a stack of images (N,height,width)
+
+    lines ... either one line (x0,y0,x1,y1) for all images 
+              or one line per image (N,4)
+    imgs_unmasked ... optional stack of images without v-cut mask
+    img_bg ... average background level or background image, same for all images
+    v_isDark ... None, bool or one bool per image
+    dtype ... compute dtype, np.float32 halves memory of the warped stacks
+
+    every image is only warped into the v-cut coordinate system, 
+    edge finding, line fitting and profile sampling is done for all images at once
+
+    returns (r, y, angle), (fitline1, fitline2, fitline3), (contrast_imgs, dsub)
+        r, y ... (N, width) - positions before v-cut intersection are NaN
+        angle ... (N,)
+    '''
+    n = len(imgs_masked)
+    lines = np.asarray(lines, dtype=float)
+    single_line = lines.ndim == 1
+    if single_line:
+        lines = lines[np.newaxis]
+    assert single_line or len(lines) == n, 'need either one line or one line per image'
+
+    s0, s1 = imgs_masked[0].shape
+    poly = ((0, 0), (s1, 0), (s1, s0), (0, s0), (0, 0))
+    lines = clipLines(lines, poly)
+    # every image is warped with the length of its line (as in measureVcut)
+    # and padded to the longest line:
+    lengths = np.round(ln.length(lines.T)).astype(int)
+    length = lengths.max()
+    height = alignTransform(lines[0], max_width, length)[1][1]
+    dsize = (length, height)
+    # crop to the region around every v-cut (see measureVcut),
+    # only the crop is converted to [dtype] - integer images would be rounded by the warp otherwise:
+    windows, trafos = [], []
+    for l, li in zip(lines, lengths):
+        M = alignTransform(l, max_width, li)[0]
+        x0, y0, x1, y1 = alignBoundingBox(l, max_width, li, shape=(s0, s1))
+        M[:, 2] += M[:, :2].dot((x0, y0))
+        windows.append((slice(y0, y1), slice(x0, x1)))
+        trafos.append(M)
+
+    def warp(img, i, out=None):
+        j = 0 if single_line else i
+        return cv2.warpAffine(img[windows[j]].astype(dtype, copy=False), trafos[j], dsize,
+                              dst=out, flags=cv2.INTER_LINEAR)
+
+    sub_masked = np.empty((n, height, length), dtype=dtype)
+    for i, img in enumerate(imgs_masked):
+        warp(img, i, sub_masked[i])
+    if imgs_unmasked is not None:
+        sub_unmasked = np.empty_like(sub_masked)
+        for i, img in enumerate(imgs_unmasked):
+            warp(img, i, sub_unmasked[i])
+
+    if img_bg is not None:
+        if np.ndim(img_bg):
+            if single_line:
+                bg = warp(img_bg, 0)
+            else:
+                bg = np.array([warp(img_bg, i) for i in range(n)])
+        else:
+            bg = img_bg
+        sub_masked -= bg
+        if imgs_unmasked is not None:
+            sub_unmasked -= bg
+
+    x = np.arange(length)
+    valid = x < lengths[:, np.newaxis]
+    if not single_line:
+        _mirrorTail(sub_masked, lengths)
+        if imgs_unmasked is not None:
+            _mirrorTail(sub_unmasked, lengths)
+
+    if not mask_is_dark:
+        # assume mtf being 0 at given end value
+        offs = (sub_masked[:, -1].sum(axis=1, where=valid) / lengths)[:, np.newaxis, np.newaxis]
+        sub_masked -= offs
+        if imgs_unmasked is not None:
+            sub_unmasked -= offs
+
+    # create 0...1 scaled contrast image:
+    if imgs_unmasked is None:
+        contrast = sub_masked
+    else:
+        # (unmasked - masked) / (unmasked + masked) without temporary stacks:
+        contrast = sub_masked
+        sub_unmasked += sub_masked
+        np.multiply(sub_masked, -2, out=contrast)
+        contrast += sub_unmasked
+        contrast /= sub_unmasked
+
+    if v_isDark is None:
+        v_isDark = contrast[:, height // 2].sum(axis=1, where=valid) \
+            > contrast[:, 0].sum(axis=1, where=valid)
+    v_isDark = np.broadcast_to(v_isDark, (n,))
+    np.subtract(1, contrast, out=contrast, where=~v_isDark[:, np.newaxis, np.newaxis])
+
+    ii = np.arange(n)[:, np.newaxis]
+    dsub = _sobelStack(contrast)
+
+    # FIND LINES: (precise)
+    line1 = np.argmin(dsub, axis=1)
+    line3 = np.argmax(dsub, axis=1)
+    line2 = 0.5 * (line1 + line3)
+
+    # find out where V ends:
+    i = np.argmax(contrast[ii, line2.round().astype(int), x] < 0.22, axis=1)
+    valid_fit = valid & ((i == 0)[:, np.newaxis] | (x < i[:, np.newaxis]))
+
+    # FIT LINEAR LINES:
+    m1, n1 = robustLinregressStack(x, line1, valid_fit)  # upper edge
+    m3, n3 = robustLinregressStack(x, line3, valid_fit)  # lower edge
+    if not np.isfinite((m1, n1, m3, n3)).all():
+        # e.g. v-cut end detected in first column (same as measureVcut):
+        raise Exception('no intersection found')
+
+    # lines y-pos:
+    fitline1 = x * m1[:, np.newaxis] + n1[:, np.newaxis]
+    fitline3 = x * m3[:, np.newaxis] + n3[:, np.newaxis]
+    fitline2 = 0.5 * (fitline1 + fitline3)  # middle line
+    y = sampleColumns(contrast, fitline2)
+
+    # Intersection of detected v-cut lines:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        i0 = (n3 - n1) / (m1 - m3)
+    i1 = m1 * i0 + n1
+    if not np.isfinite(i0).all():
+        raise Exception('no intersection found')
+    # Angle of intersection:
+    cos = (1 + m1 * m3) / (np.hypot(1, m1) * np.hypot(1, m3))
+    angle = np.arccos(cos.clip(-1, 1))
+    dx = x - i0[:, np.newaxis]
+    dy = fitline2 - i1[:, np.newaxis]
+    # radii from intersection:
+    r = np.hypot(dx, dy)
+
+    # exclude area behind intersection:
+    behind_intersection = np.argmax(dx > 0, axis=1)
+    valid &= x >= behind_intersection[:, np.newaxis]
+    r[~valid] = np.nan
+    y[~valid] = np.nan
+
+    if imgs_unmasked is None:
+        # only one masked image avail. normalize y 0...1:
+        normalizeProfiles(y)
+
+    return (r, y, angle), (fitline1, fitline2, fitline3), (contrast, dsub)
+
 
  
 def plot(VALS, LINES, SUB):
     '''
     plot the result of vCut2MTF
     '''
+    import pylab as plt
     r, y, angle = VALS
     (fitline1, fitline2, fitline3) = LINES
     (sub, _dsub) = SUB
@@ -173,13 +562,28 @@ def plot(VALS, LINES, SUB):
     
 
 if __name__ == '__main__':
+    from time import time
     from generate import patVcut
     import pylab as plt
     
     std = 2
     img_masked, img_unmasked, line = patVcut(std)
     out = measureVcut(img_masked, line, img_unmasked)
-        
+
+    # compare speed of single and stacked measurement:
+    n = 100
+    stack_masked = np.array([img_masked] * n)
+    stack_unmasked = np.array([img_unmasked] * n)
+    t0 = time()
+    for i in range(n):
+        measureVcut(stack_masked[i], line, stack_unmasked[i])
+    t_single = time() - t0
+    t0 = time()
+    measureVcutStack(stack_masked, line, stack_unmasked)
+    t_stack = time() - t0
+    print('frames/s measureVcut: %.1f, measureVcutStack: %.1f' % (
+        n / t_single, n / t_stack))
+
     plot(*out)    
     plt.show()
     
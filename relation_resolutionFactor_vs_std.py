@@ -4,23 +4,31 @@ and resolution factor [fres]
 '''
 
 import cv2
-import pylab as plt
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
-from scipy.ndimage.filters import gaussian_filter
-from scipy.optimize import brent
-from scipy.optimize.minpack import curve_fit
+from scipy.fft import dctn, idctn
+from scipy.ndimage import gaussian_filter
+from scipy.optimize import brent, curve_fit
 
 # local
 from generate import patSiemensStar
+from utils.calibration import CalibrationStore
 from utils.transforms import _std2ResFactor_fitfn
 
 
-def calc(pattern_fn, s0=1000, N=30):
+def calc(pattern_fn, s0=1000, N=30, engine='spatial', n_workers=1, tol=1.48e-8, fres=None):
     '''
     pattern_fn ... function(image_size) returning systhetic test image 
     s0         ... pattern size
     N          ... number of data points to be calculated  
+    engine     ... 'spatial': blur with scipy.ndimage.gaussian_filter for every std
+                   'fft': transform pattern once, blur by multiplying with
+                          Gaussian transfer function (see GaussianBlurDCT) - much faster for big patterns
+    n_workers  ... number of threads, resolution factors are processed in parallel
+    tol        ... relative tolerance of std (see scipy.optimize.brent)
+                   1e-4 needs about half the blur operations
+    fres       ... resolution factors to calculate - N log-spaced values within 1-10 if None
     
     1. down-sample image (img0->img1)
         e.g.: fres = 2, image size=100x100
@@ -32,16 +40,19 @@ def calc(pattern_fn, s0=1000, N=30):
     returns [standard deviations], [resolution factors]
     '''
     # resolution factors
-    fres0 = np.logspace(0.01, 1, N)  # 1-10
-    fres1 = []  # same, corrected for integer image size
-    stds = []
+    fres0 = np.logspace(0.01, 1, N) if fres is None else fres  # 1-10
     img0 = pattern_fn(s0).astype(float)  # initial image
 
-    for f in fres0:
+    if engine == 'fft':
+        blur = GaussianBlurDCT(img0)
+    elif engine == 'spatial':
+        blur = lambda std: gaussian_filter(img0, std)
+    else:
+        raise ValueError("engine has to be 'spatial' or 'fft'")
 
+    def fit(f):
         res = int(round(s0 / f))  # res resolution to resize to
-        f = s0 / float(res)
-        fres1.append(f)  # corrected scale factor
+        f = s0 / float(res)  # corrected scale factor
 
         # low qual:
             # smaller
@@ -52,16 +63,76 @@ def calc(pattern_fn, s0=1000, N=30):
         # determine std which gives most similar sharpness values
         # blured(img0) -> img2
         # use average-absolute-deviation(AAD) to calculate error:
-        fn = lambda std: np.abs(img2 - (gaussian_filter(img0, abs(std))) 
-                                ).mean() 
+        fn = lambda std: _aad(blur(abs(std)), img2)
 
-        std = abs(brent(fn))  # minimize algorithm
-        stds.append(std)
+        std = abs(brent(fn, tol=tol))  # minimize algorithm
+        return std, f
 
-    return np.array(stds), fres1
+    if n_workers == 1:
+        out = [fit(f) for f in fres0]
+    else:
+        with ThreadPoolExecutor(n_workers) as pool:
+            out = list(pool.map(fit, fres0))
+    stds, fres1 = zip(*out)  # fres1 ... same as fres0, corrected for integer image size
+    return np.array(stds), list(fres1)
+
+
+def _aad(blurred, img):
+    # average absolute deviation, [blurred] is overridden
+    blurred -= img
+    return np.abs(blurred, out=blurred).mean()
+
+
+class GaussianBlurDCT(object):
+    '''
+    blur one image with Gaussian kernels of different std
+
+    the discrete cosine transform (DCT-II) of the image is only calculated once.
+    It is the Fourier transform of the mirrored image, so blurring is a multiplication with
+    the analytic Gaussian transfer function exp(-2*(pi*std*f)**2) and has the same
+    border handling as gaussian_filter(mode='reflect').
+    For std < 1 the result differs from gaussian_filter, which uses a sampled kernel.
+    '''
+
+    def __init__(self, img):
+        self.shape = img.shape
+        self.coeffs = dctn(img, type=2, norm='ortho')
+
+    def transfer(self, n, std):
+        '''
+        Gaussian transfer function for all [n] DCT frequencies
+        '''
+        f = np.arange(n) / (2. * n)  # [cycles/px]
+        return np.exp(-2 * (np.pi * std * f) ** 2)
+
+    def __call__(self, std):
+        s0, s1 = self.shape
+        # transfer function is separable:
+        t = self.transfer(s0, std)[:, np.newaxis] * self.transfer(s1, std)
+        return idctn(self.coeffs * t, type=2, norm='ortho', overwrite_x=True)
+
+
+def fit(stds, fres):
+    '''
+    fit relation between std and fres (see utils.transforms.std2ResFactor)
+    returns ascent for std>=1, parameters of _std2ResFactor_fitfn for std<1
+    '''
+    ind = np.argmax(stds >= 1)
+    upper_stds = stds[ind:]
+    lower_stds = stds[:ind ]
+
+    ####fit 1 (linear, for std>1)
+    xx = upper_stds[:, np.newaxis]
+    m = np.linalg.lstsq(xx, fres[ind:], rcond=None)[0][0]  # y = a*x
+
+    ####fit 2 (log+lin, for std<1)
+    # this fit can fail if not enough point are avail
+    param, _perr = curve_fit(_std2ResFactor_fitfn, lower_stds, fres[:ind], (1, 1, 1, 1.5))
+    return m, param
 
 
 def plot(stds, fres):
+    import pylab as plt
 
     plt.xlabel('standard deviation [px]')
     plt.ylabel('resolution factor [-]')
@@ -72,17 +143,11 @@ def plot(stds, fres):
     upper_stds = stds[ind:]
     lower_stds = stds[:ind ]
 
-    ####fit 1 (linear, for std>1)
-    xx = upper_stds[:, np.newaxis]
-    m, _, _, _ = np.linalg.lstsq(xx, fres[ind:])  # y = a*x
+    m, param = fit(stds, fres)
     print('ascent for std>=1: ', m)
     plt.plot(upper_stds, m * upper_stds, label='''fit: y=m*x
         m=%.2f''' % m)
     
-    ####fit 2 (log+lin, for std<1)
-    # this fit can fail if not enough point are avail
-
-    param, _perr = curve_fit(_std2ResFactor_fitfn, lower_stds, fres[:ind], (1, 1, 1, 1.5))
     print ('linlog fn params: ', param)
     plt.plot(lower_stds, _std2ResFactor_fitfn(lower_stds, *param), label='''fit: y=m*log(x*n)+x*o+p
         m=%.2f
@@ -95,5 +160,39 @@ def plot(stds, fres):
 
 
 if __name__ == '__main__':
-    stds, fres = calc(patSiemensStar)
-    plot(stds, fres)
+    import argparse
+    parser = argparse.ArgumentParser(description='relation between std and resolution factor')
+    parser.add_argument('-s', '--size', type=int, default=1000, help='pattern size [px]')
+    parser.add_argument('-n', type=int, default=30, help='number of data points')
+    parser.add_argument('-e', '--engine', type=str, default='spatial', help="'spatial' or 'fft'")
+    parser.add_argument('-w', '--workers', type=int, default=1, help='number of threads')
+    parser.add_argument('--tol', type=float, default=1.48e-8, help='relative tolerance of std')
+    parser.add_argument('--no_store', action='store_true',
+                        help="don't use and update calibration store (utils/calibration.py)")
+    args = parser.parse_args()
+
+    if args.no_store:
+        stds, fres = calc(patSiemensStar, args.size, args.n, args.engine, args.workers, args.tol)
+        plot(stds, np.array(fres))
+    else:
+        # only calculate data points that are not stored yet:
+        params = {'pattern': 'siemensStar', 'size': args.size, 'engine': args.engine}
+        store = CalibrationStore()
+        compute = lambda missing: [list(p) for p in zip(*calc(
+            patSiemensStar, args.size, engine=args.engine, n_workers=args.workers,
+            tol=args.tol, fres=missing))]
+        points = store.points('relation', params, 'std_fres(tol=%g)' % args.tol,
+                              np.logspace(0.01, 1, args.n), compute)
+        store.save()
+        stds, fres = np.array(points).T
+        m, param = fit(stds, fres)
+        store.setCoeffs('relation', params, activate=True,
+                        std2fres_bigger1=float(m), std2fres_smaller1=[float(p) for p in param])
+        store.save()
+        print('stored in %s as active calibration' % store.path)
+        try:
+            store.coeffs()
+        except ValueError as e:
+            # active vcut calibration was fitted with another relation:
+            print(e)
+        plot(stds, fres)
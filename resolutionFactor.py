@@ -1,21 +1,33 @@
+import numpy as np
+
 # local
-from utils.findXAt import findXAt
+from utils.findXAt import findCrossing
+from utils.stageStats import stages
+from utils import calibration
 
-_resolutionFactor_coeff = [1.98784598, 0.38044078, 0.91077515, 1.00170451]
+# correction coefficients 'resolutionFactor' are loaded from the active calibration
+# (see utils/calibration.py and get_fres_coeffs.py)
 
 
 def _resolutionFactor_corr(f, a, b, c, d):
-    if f < 2.2:
-        return (f ** a) * b
-    return (f ** c) * d
+    f = np.asarray(f, dtype=float)
+    return np.where(f < 2.2, (f ** a) * b, (f ** c) * d)[()]
 
 
-def resolutionFactor(radii, contrasts, vcut_angle):
+def resolutionFactor(radii, contrasts, vcut_angle, stats=None):
     '''
     current implementation of simplified image sharpness calculation expressed as 
     'resolution factor'  [see file #######.py]
     using 'v-cut' method [see file ####.py]
+
+    radii, contrasts ... (N,) or (B,N) for B measurements (e.g. from measureVcutStack)
+    vcut_angle ... float or (B,)
+    stats ... optional utils.stageStats.StageStats to record time and memory of every stage
+    returns NaN if contrasts don't cross 0.5
     '''
-    r50 = findXAt(radii, contrasts, 0.5)  # distance from v-cut line intersection to half contrast
-    fres0 = vcut_angle * r50
-    return _resolutionFactor_corr(fres0, *_resolutionFactor_coeff)
+    stage = stages(stats)
+    with stage('crossing'):
+        r50 = findCrossing(radii, contrasts, 0.5)  # distance from v-cut line intersection to half contrast
+    with stage('correction'):
+        fres0 = vcut_angle * r50
+        return _resolutionFactor_corr(fres0, *calibration.coeffs()['resolutionFactor'])
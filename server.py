@@ -0,0 +1,362 @@
+'''
+long running measurement server for inline testers
+
+modules are only imported once, calibration, fixture geometry (see fixture.VcutFixture)
+and unmasked/background images stay cached between requests.
+Requests are handled by an asyncio front end and measured in a pool of worker threads.
+
+    python server.py --unix /tmp/vcut.sock
+    python server.py --port 8765
+
+HTTP requests (JSON responses with the fields of fromFile.FIELDS):
+
+    POST /measure   body: JSON {"masked": path, "line": [x0,y0,x1,y1],
+                                optional: "unmasked": path, "background": path,
+                                "max_width": 101, "mask_is_dark": true, "fixture": name}
+    POST /measure?line=x0,y0,x1,y1&shape=height,width&dtype=uint16[&fixture=name&offset=0]
+                    body: raw image buffer
+    GET /status     number of requests, cached fixtures and images, calibration, stage statistics
+    DELETE /fixture/<name>   forget cached fixture geometry
+
+Requests with the same fixture name reuse the detected v-cut geometry.
+The fixture is created again if line, max_width, background or mask_is_dark change.
+
+    >>> client = Client(unix='/tmp/vcut.sock')
+    >>> client.measure(masked='masked.png', line=[10, 20, 100, 25])
+    >>> client.measure(raw=img, line=[10, 20, 100, 25], fixture='station1')
+'''
+
+import asyncio
+import http.client
+import json
+import os
+import socket
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import numpy as np
+
+# local
+from fixture import VcutFixture
+from fromFile import FIELDS, measureImages, parseLine
+from utils import calibration
+from utils.imgIO import imread
+from utils.stageStats import StageStats
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+class MeasurementServer(object):
+    '''
+    n_workers    ... number of measurement threads
+    max_width, mask_is_dark ... defaults if not given in request (see measure.measureVcut)
+    n_cached     ... maximum number of cached unmasked and background images
+    stats        ... collect time and memory of all processing stages (see GET /status)
+    '''
+
+    def __init__(self, n_workers=4, max_width=101, mask_is_dark=True, n_cached=16,
+                 stats=False):
+        self.pool = ThreadPoolExecutor(n_workers)
+        self.defaults = {'max_width': max_width, 'mask_is_dark': mask_is_dark}
+        self.n_cached = n_cached
+        self.stats = StageStats() if stats else None
+        self.fixtures = {}  # name -> (settings, VcutFixture, lock)
+        self.images = OrderedDict()  # (path, mtime) -> image
+        self._lock = threading.Lock()
+        self.n_requests = 0
+        self.t_start = time()
+        # load calibration now, not on first request:
+        calibration.coeffs()
+
+    def cachedImage(self, path):
+        '''
+        unmasked and background images are usually the same for many requests
+        '''
+        if not path:
+            return None
+        key = (path, os.path.getmtime(path))
+        with self._lock:
+            img = self.images.get(key)
+            if img is not None:
+                self.images.move_to_end(key)
+                return img
+        img = imread(path)
+        with self._lock:
+            self.images[key] = img
+            while len(self.images) > self.n_cached:
+                self.images.popitem(last=False)
+        return img
+
+    def fixture(self, name, line, img_bg, max_width, mask_is_dark, bg_key):
+        '''
+        cached fixture [name] - created again if its settings changed
+        returns fixture, lock
+        '''
+        settings = (tuple(line), max_width, mask_is_dark, bg_key)
+        with self._lock:
+            cached = self.fixtures.get(name)
+            if cached is None or cached[0] != settings:
+                cached = (settings,
+                          VcutFixture(line, img_bg, max_width, mask_is_dark=mask_is_dark),
+                          threading.Lock())
+                self.fixtures[name] = cached
+        return cached[1], cached[2]
+
+    def measure(self, request, body=None):
+        '''
+        measure one request (dict of parameters)
+        body ... raw image buffer, image is read from request['masked'] if None
+        returns record (dict with keys in fromFile.FIELDS)
+        '''
+        record = dict.fromkeys(FIELDS)
+        record['masked'] = request.get('masked')
+        try:
+            t0 = time()
+            line = request.get('line')
+            if isinstance(line, str):
+                line = parseLine(line)
+            if body is not None:
+                shape = request['shape']
+                if isinstance(shape, str):
+                    shape = [int(s) for s in shape.split(',')]
+                offset = int(request.get('offset', 0))
+                img_masked = np.frombuffer(body, dtype=request.get('dtype', 'uint16'),
+                                           offset=offset).reshape(shape)
+            else:
+                img_masked = imread(request['masked'])
+            img_unmasked = self.cachedImage(request.get('unmasked'))
+            img_bg = self.cachedImage(request.get('background'))
+            record['t_read'] = time() - t0
+
+            t0 = time()
+            max_width = int(request.get('max_width', self.defaults['max_width']))
+            mask_is_dark = request.get('mask_is_dark', self.defaults['mask_is_dark'])
+            if isinstance(mask_is_dark, str):
+                mask_is_dark = mask_is_dark.lower() in ('1', 'true', 'yes')
+            name = request.get('fixture')
+            if name:
+                if line is None:
+                    raise Exception('no line given')
+                fixture, lock = self.fixture(name, line, img_bg, max_width, mask_is_dark,
+                                             request.get('background'))
+                with lock:
+                    record.update(measureImages(img_masked, line, img_unmasked,
+                                                fixture=fixture, stats=self.stats))
+            else:
+                record.update(measureImages(img_masked, line, img_unmasked, img_bg,
+                                            max_width, mask_is_dark, self.stats))
+            record['t_measure'] = time() - t0
+        except Exception as e:
+            record['error'] = '%s: %s' % (type(e).__name__, e)
+        return record
+
+    def status(self):
+        # worker threads add fixtures and images concurrently:
+        with self._lock:
+            fixtures = list(self.fixtures.items())
+            n_cached_images = len(self.images)
+        out = {'uptime': time() - self.t_start,
+               'n_requests': self.n_requests,
+               'fixtures': {name: {'n_images': f.n_images, 'n_fits': f.n_fits}
+                            for name, (_, f, _) in fixtures},
+               'n_cached_images': n_cached_images,
+               'calibration': calibration.coeffs()}
+        if self.stats is not None:
+            out['stages'] = self.stats.summary()
+        return out
+
+    async def respond(self, method, target, headers, body):
+        '''
+        returns HTTP status, JSON serializable response
+        '''
+        url = urlsplit(target)
+        path = url.path.rstrip('/')
+        if path == '/measure':
+            if method != 'POST':
+                return 405, {'error': 'use POST'}
+            if headers.get('content-type', '').startswith('application/json'):
+                request, body = json.loads(body.decode() or '{}'), None
+            else:
+                request = dict(parse_qsl(url.query))
+                if 'shape' not in request:
+                    return 400, {'error': 'raw image buffers need shape=height,width'}
+            self.n_requests += 1
+            loop = asyncio.get_running_loop()
+            return 200, await loop.run_in_executor(self.pool, self.measure, request, body)
+        if path == '/status' and method == 'GET':
+            return 200, self.status()
+        if path.startswith('/fixture/') and method == 'DELETE':
+            with self._lock:
+                found = self.fixtures.pop(path[len('/fixture/'):], None) is not None
+            return (200, {'deleted': True}) if found else (404, {'error': 'unknown fixture'})
+        return 404, {'error': 'unknown path %s' % path}
+
+    async def handle(self, reader, writer):
+        '''
+        HTTP/1.1 connection, kept alive for following requests
+        '''
+        try:
+            while True:
+                first = await reader.readline()
+                if not first.strip():
+                    break
+                method, target, _version = first.decode('latin-1').split()
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    key, value = header.decode('latin-1').split(':', 1)
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                try:
+                    status, response = await self.respond(method, target, headers, body)
+                except (ValueError, KeyError) as e:
+                    status, response = 400, {'error': '%s: %s' % (type(e).__name__, e)}
+                except Exception as e:
+                    status, response = 500, {'error': '%s: %s' % (type(e).__name__, e)}
+                data = json.dumps(response).encode()
+                writer.write(b'HTTP/1.1 %i %s\r\nContent-Type: application/json\r\n'
+                             b'Content-Length: %i\r\n\r\n' % (
+                                 status, REASONS[status].encode(), len(data)) + data)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, unix=None, host='127.0.0.1', port=8765, ready=None):
+        '''
+        serve on Unix socket [unix] or on [host]:[port] until cancelled
+        ready ... optional threading.Event set when server accepts connections
+        '''
+        if unix is not None:
+            if os.path.exists(unix):
+                os.remove(unix)
+            server = await asyncio.start_unix_server(self.handle, unix)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+    def run(self, unix=None, host='127.0.0.1', port=8765):
+        try:
+            asyncio.run(self.serve(unix, host, port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.pool.shutdown()
+            if unix is not None and os.path.exists(unix):
+                os.remove(unix)
+
+
+class _UnixConnection(http.client.HTTPConnection):
+
+    def __init__(self, path, timeout=None):
+        http.client.HTTPConnection.__init__(self, 'localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class Client(object):
+    '''
+    client for MeasurementServer - connection is kept open between requests
+    '''
+
+    def __init__(self, unix=None, host='127.0.0.1', port=8765, timeout=30):
+        if unix is not None:
+            self.conn = _UnixConnection(unix, timeout)
+        else:
+            self.conn = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _request(self, method, url, body=None, headers=None):
+        self.conn.request(method, url, body, headers or {})
+        return json.loads(self.conn.getresponse().read().decode())
+
+    def measure(self, masked=None, line=None, raw=None, **kwargs):
+        '''
+        masked ... image path (read by server)
+        raw    ... image array, sent as raw buffer
+        line   ... (x0,y0,x1,y1)
+        kwargs ... unmasked, background, max_width, mask_is_dark, fixture
+
+        returns record (dict with keys in fromFile.FIELDS)
+        '''
+        kwargs = {k: v for k, v in kwargs.items() if v is not None}
+        if raw is not None:
+            raw = np.ascontiguousarray(raw)
+            query = dict(kwargs, shape='%i,%i' % raw.shape, dtype=raw.dtype.str)
+            if line is not None:
+                query['line'] = ','.join(str(float(l)) for l in line)
+            url = '/measure?' + urlencode(query)
+            return self._request('POST', url, raw.tobytes(),
+                                 {'Content-Type': 'application/octet-stream'})
+        request = dict(kwargs, masked=masked)
+        if line is not None:
+            request['line'] = [float(l) for l in line]
+        return self._request('POST', '/measure', json.dumps(request),
+                             {'Content-Type': 'application/json'})
+
+    def status(self):
+        return self._request('GET', '/status')
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='Image sharpness measurement server')
+    parser.add_argument('--unix', type=str, default=None, help='path of Unix socket')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='host (if no Unix socket)')
+    parser.add_argument('--port', type=int, default=8765, help='port (if no Unix socket)')
+    parser.add_argument('-n', '--workers', type=int, default=4, help='number of worker threads')
+    parser.add_argument('-w', '--max_width', type=int, default=101, help='default maximum width [px] of v-cut')
+    parser.add_argument('--mask_not_dark', dest='mask_is_dark', action='store_false',
+                        help='default, if mask if not completely opaque')
+    parser.add_argument('--stats', action='store_true', help='collect stage statistics (GET /status)')
+    parser.add_argument('--calibration', type=str, default=None, help='calibration store file')
+    parser.add_argument('--demo', action='store_true',
+                        help='start server in background and measure masked.png, line.txt')
+    parser.set_defaults(mask_is_dark=True)
+    args = parser.parse_args()
+
+    if args.calibration is not None:
+        calibration.use(path=args.calibration)
+    server = MeasurementServer(args.workers, args.max_width, args.mask_is_dark,
+                               stats=args.stats)
+    if not args.demo:
+        server.run(args.unix, args.host, args.port)
+        sys.exit()
+
+    # demo: compare request time with and without fixture
+    unix = args.unix or '/tmp/vcut_demo.sock'
+    ready = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(server.serve(unix, ready=ready)),
+                     daemon=True).start()
+    ready.wait()
+    client = Client(unix=unix)
+    line = parseLine(open('line.txt', 'r').read())
+    img = imread('masked.png')
+    for fixture in (None, 'demo'):
+        t0 = time()
+        for _ in range(20):
+            record = client.measure(raw=img, line=line, fixture=fixture)
+        print('fixture=%s: %.2f ms/request' % (fixture, (time() - t0) / 20 * 1e3))
+        print(record)
+    print(client.measure(masked='masked.png', line=line))
+    print(client.status())
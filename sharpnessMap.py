@@ -0,0 +1,339 @@
+'''
+measure several v-cuts in one image
+and interpolate the resulting image sharpness across the image plane
+
+gridSharpness measures a whole grid of v-cuts (e.g. across a PV module) in parallel tiles
+and fits a smooth field curvature surface to the result
+'''
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# local
+from measure import measureVcut
+from resolutionFactor import resolutionFactor
+from utils.alignImageAlongLine import alignBoundingBox
+from utils.line import clipLines
+from utils.transforms import resFactor2std
+
+
+def measureVcuts(img_masked, lines, img_unmasked=None, img_bg=None,
+                 max_width=101,
+                 mask_is_dark=False,
+                 v_isDark=None,
+                 n_workers=1,
+                 ignore_errors=False,
+                 executor='thread',
+                 pool=None,
+                 dtype=float):
+    '''
+    same as measureVcut, but for a list of lines (one per v-cut) in one image
+    only the tile around every v-cut is converted to float (see measureTiles)
+
+    n_workers, executor, pool ... see measureTiles
+    ignore_errors ... if True, return None for v-cuts that could not be measured
+    dtype ... compute dtype, see measure.measureVcut
+
+    returns list of measureVcut results
+    '''
+    kwargs = {'max_width': max_width, 'mask_is_dark': mask_is_dark, 'v_isDark': v_isDark,
+              'dtype': dtype}
+    tasks = _tiles(img_masked, lines, img_unmasked, img_bg, kwargs, ignore_errors)
+    return _map(_measureTile, tasks, n_workers, executor, pool)
+
+
+def interpolateMap(positions, values, shape, step=10, method='linear'):
+    '''
+    interpolate scattered [values] at [positions](x,y) onto a grid of given image [shape]
+    step ... grid resolution [px]
+    values outside the convex hull of [positions] are filled with nearest values
+    '''
+    from scipy.interpolate import griddata
+    positions = np.asarray(positions, dtype=float)
+    values = np.asarray(values, dtype=float)
+    valid = np.isfinite(values)
+    positions = positions[valid]
+    values = values[valid]
+    assert len(values), 'no valid values given'
+
+    s0, s1 = shape
+    yy, xx = np.mgrid[step // 2:s0:step, step // 2:s1:step]
+    nearest = griddata(positions, values, (xx, yy), method='nearest')
+    if len(values) < 3 or method == 'nearest':
+        return nearest
+    try:
+        arr = griddata(positions, values, (xx, yy), method=method)
+    except Exception:  # e.g. all points on one line
+        return nearest
+    invalid = np.isnan(arr)
+    arr[invalid] = nearest[invalid]
+    return arr
+
+
+def sharpnessMap(img_masked, lines, img_unmasked=None, img_bg=None,
+                 step=10, n_workers=1, dtype=float, **kwargs):
+    '''
+    measure all v-cuts given by [lines] and interpolate the
+    resolution factor across the image plane
+
+    step ... resolution of the returned map [px]
+    dtype ... compute dtype, see measure.measureVcut
+    kwargs ... passed to measureVcuts
+
+    returns results(list of measureVcut results, None if v-cut couldn't be measured),
+            fres(one resolution factor per v-cut),
+            fres_map(2d array)
+    use utils.transforms.resFactor2std(fres_map) to obtain a std map
+    '''
+    results = measureVcuts(img_masked, lines, img_unmasked, img_bg,
+                           n_workers=n_workers, ignore_errors=True, dtype=dtype, **kwargs)
+    fres = np.full(len(lines), np.nan)
+    for i, res in enumerate(results):
+        if res is not None:
+            fres[i] = resolutionFactor(*res[0])  # NaN if no half contrast position found
+    # position of every v-cut ... middle of line:
+    positions = [(0.5 * (x0 + x1), 0.5 * (y0 + y1)) for x0, y0, x1, y1 in lines]
+    fres_map = interpolateMap(positions, fres, img_masked.shape, step)
+    return results, fres, fres_map
+
+
+def gridLines(line, pitch, shape, rotation=0):
+    '''
+    lines of a regular array of v-cuts
+
+    line     ... (x0,y0,x1,y1) of first v-cut (see measure.measureVcut)
+    pitch    ... (dx, dy) distance [px] between neighbouring v-cuts in a row and a column
+    shape    ... (n_rows, n_cols)
+    rotation ... rotation [rad] of the grid rows against the image x axis
+
+    returns lines (n_rows*n_cols, 4), row by row
+    '''
+    n_rows, n_cols = shape
+    ex = np.array((np.cos(rotation), np.sin(rotation))) * pitch[0]
+    ey = np.array((-np.sin(rotation), np.cos(rotation))) * pitch[1]
+    rr, cc = np.mgrid[:n_rows, :n_cols].reshape(2, -1)
+    offs = cc[:, np.newaxis] * ex + rr[:, np.newaxis] * ey
+    return np.asarray(line, dtype=float) + np.tile(offs, 2)
+
+
+def _tiles(img_masked, lines, img_unmasked, img_bg, kwargs, ignore_errors=False):
+    # one task per v-cut: only the tile around the v-cut, its line in tile coordinates
+    # and measureVcut arguments
+    s0, s1 = img_masked.shape
+    poly = ((0, 0), (s1, 0), (s1, s0), (0, s0), (0, 0))
+    tasks = []
+    for line in clipLines(lines, poly):
+        x0, y0, x1, y1 = alignBoundingBox(line, kwargs['max_width'], shape=(s0, s1))
+        window = slice(y0, y1), slice(x0, x1)
+        tasks.append((img_masked[window],
+                      (line[0] - x0, line[1] - y0, line[2] - x0, line[3] - y0),
+                      None if img_unmasked is None else img_unmasked[window],
+                      img_bg[window] if np.ndim(img_bg) else img_bg,
+                      kwargs, ignore_errors))
+    return tasks
+
+
+def _map(fn, tasks, n_workers, executor, pool):
+    # run fn for all tasks - in given pool, serial or in a new thread/process pool
+    if pool is not None:
+        return list(pool.map(fn, tasks))
+    if n_workers == 1:
+        return [fn(t) for t in tasks]
+    Executor = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    with Executor(n_workers) as pool:
+        return list(pool.map(fn, tasks))
+
+
+def _measureTile(task):
+    # measureVcut result of one v-cut, None if it couldn't be measured and errors are ignored
+    tile_masked, line, tile_unmasked, tile_bg, kwargs, ignore_errors = task
+    try:
+        return measureVcut(tile_masked, line, tile_unmasked, tile_bg, **kwargs)
+    except Exception:
+        if ignore_errors:
+            return None
+        raise
+
+
+def _tileFres(task):
+    # resolution factor of one v-cut, NaN if it couldn't be measured
+    res = _measureTile(task)
+    if res is None:
+        return np.nan
+    return resolutionFactor(*res[0])
+
+
+def measureTiles(img_masked, lines, img_unmasked=None, img_bg=None,
+                 max_width=101, mask_is_dark=False, v_isDark=None,
+                 n_workers=None, executor='process', pool=None, dtype=float):
+    '''
+    resolution factor of all v-cuts given by [lines]
+    same as measureVcuts, but only the resolution factor is returned from the workers
+
+    only the tile around every v-cut is cut out and sent to the workers,
+    so measuring in processes doesn't copy the whole image
+
+    n_workers ... number of workers, all cores if None, no parallelization if 1
+    executor  ... 'process' or 'thread'
+    pool      ... existing concurrent.futures executor, e.g. to avoid starting processes
+                  for every image
+    dtype     ... compute dtype, see measure.measureVcut
+
+    returns fres (len(lines),) - NaN for v-cuts that couldn't be measured
+    '''
+    kwargs = {'max_width': max_width, 'mask_is_dark': mask_is_dark, 'v_isDark': v_isDark,
+              'dtype': dtype}
+    tasks = _tiles(img_masked, lines, img_unmasked, img_bg, kwargs, ignore_errors=True)
+    return np.array(_map(_tileFres, tasks, n_workers, executor, pool))
+
+
+class Surface(object):
+    '''
+    robust polynomial fit z = sum(c_ij * x**i * y**j), i+j <= order
+    e.g. field curvature (order=2) or lens tilt (order=1) of an image sharpness map
+
+    positions ... (n,2) x,y
+    values    ... (n,) - NaN values are ignored
+    n_iter, nstd ... number of fits, removing values deviating more than [nstd]
+                     standard deviations of the residuals (see utils.robustLinregress)
+    order is reduced if there are not enough values
+    '''
+
+    def __init__(self, positions, values, order=2, n_iter=3, nstd=3):
+        positions = np.asarray(positions, dtype=float)
+        values = np.asarray(values, dtype=float)
+        valid = np.isfinite(values)
+        n = valid.sum()
+        assert n, 'no valid values given'
+        # highest order with more values than coefficients:
+        while order and (order + 1) * (order + 2) // 2 >= n:
+            order -= 1
+        self.order = order
+        # normalize coordinates for numerical stability:
+        self.center = positions[valid].mean(axis=0)
+        self.scale = np.maximum(positions[valid].std(axis=0), 1)
+
+        A = self._design(positions[:, 0], positions[:, 1])
+        inliers = valid
+        for _ in range(n_iter):
+            self.coeffs = np.linalg.lstsq(A[inliers], values[inliers], rcond=None)[0]
+            residuals = values - A.dot(self.coeffs)
+            self.residual_std = residuals[inliers].std()
+            new = valid & (np.abs(residuals) <= nstd * self.residual_std)
+            if new.sum() <= len(self.coeffs) or (new == inliers).all():
+                break
+            inliers = new
+        self.inliers = inliers
+
+    def _design(self, x, y):
+        u = (np.asarray(x, dtype=float) - self.center[0]) / self.scale[0]
+        v = (np.asarray(y, dtype=float) - self.center[1]) / self.scale[1]
+        return np.stack([u ** i * v ** j for i in range(self.order + 1)
+                         for j in range(self.order + 1 - i)], axis=-1)
+
+    def __call__(self, x, y):
+        return self._design(x, y).dot(self.coeffs)
+
+    def map(self, shape, step=10):
+        '''
+        surface evaluated on a grid of given image [shape] with resolution [step] px
+        '''
+        s0, s1 = shape
+        yy, xx = np.mgrid[step // 2:s0:step, step // 2:s1:step]
+        return self(xx, yy)
+
+
+def gridSharpness(img_masked, lines, img_unmasked=None, img_bg=None, grid_shape=None,
+                  step=10, order=2, **kwargs):
+    '''
+    measure a grid of v-cuts in parallel tiles (see measureTiles)
+    and fit a smooth std surface (field curvature, see Surface) to the result
+
+    lines      ... (n,4) one line per v-cut, e.g. from gridLines
+    grid_shape ... (n_rows, n_cols) of a regular grid - results are returned as 2d maps then
+    step       ... resolution [px] of the returned surface map
+    order      ... polynomial order of the surface
+    kwargs     ... passed to measureTiles
+
+    returns fres, std ... (n_rows, n_cols) or (n,)
+            surface   ... Surface of std over image positions x,y
+            surface_map ... surface evaluated across the image, resolution [step]
+    '''
+    lines = np.asarray(lines, dtype=float)
+    fres = measureTiles(img_masked, lines, img_unmasked, img_bg, **kwargs)
+    std = resFactor2std(fres)
+    std[np.isnan(fres)] = np.nan
+    # position of every v-cut ... middle of line:
+    positions = 0.5 * (lines[:, :2] + lines[:, 2:])
+    surface = Surface(positions, std, order)
+    surface_map = surface.map(img_masked.shape, step)
+    if grid_shape is not None:
+        fres = fres.reshape(grid_shape)
+        std = std.reshape(grid_shape)
+    return fres, std, surface, surface_map
+
+
+if __name__ == '__main__':
+    import pylab as plt
+    from generate import patVcut
+
+    # place 9 synthetic v-cuts with increasing blur in one image:
+    size = 401
+    n = 3
+    img_masked = np.empty((n * size, n * size))
+    img_unmasked = np.empty_like(img_masked)
+    lines = []
+    stds = np.linspace(1, 3, n * n)
+    for i, std in enumerate(stds):
+        y0, x0 = divmod(i, n)
+        y0 *= size
+        x0 *= size
+        m, u, line = patVcut(std, size=size)
+        img_masked[y0:y0 + size, x0:x0 + size] = m
+        img_unmasked[y0:y0 + size, x0:x0 + size] = u
+        lines.append((line[0] + x0, line[1] + y0, line[2] + x0, line[3] + y0))
+
+    results, fres, fres_map = sharpnessMap(img_masked, lines, img_unmasked,
+                                           n_workers=4)
+    print('given std:', stds)
+    print('measured std:', resFactor2std(fres))
+
+    plt.figure('masked')
+    plt.imshow(img_masked)
+    for x0, y0, x1, y1 in lines:
+        plt.plot((x0, x1), (y0, y1))
+    plt.figure('std map')
+    plt.imshow(resFactor2std(fres_map))
+    plt.colorbar()
+
+    # grid of 4x6 v-cuts, blur increases towards the image corners (field curvature):
+    from time import time
+    n_rows, n_cols = 4, 6
+    rng = np.random.default_rng(0)
+    size = 301
+    img_masked = np.empty((n_rows * size, n_cols * size))
+    img_unmasked = np.empty_like(img_masked)
+    c0, c1 = (n_rows - 1) / 2, (n_cols - 1) / 2
+    for i in range(n_rows):
+        for j in range(n_cols):
+            std = 1 + 0.15 * ((i - c0) ** 2 + (j - c1) ** 2)
+            m, u, line = patVcut(std, phi=0.3, angle_rad=0.08, size=size, rng=rng)
+            img_masked[i * size:(i + 1) * size, j * size:(j + 1) * size] = m
+            img_unmasked[i * size:(i + 1) * size, j * size:(j + 1) * size] = u
+    lines = gridLines(line, (size, size), (n_rows, n_cols))
+    for n_workers in (1, None):
+        t0 = time()
+        fres, std, surface, surface_map = gridSharpness(
+            img_masked, lines, img_unmasked, grid_shape=(n_rows, n_cols), n_workers=n_workers)
+        print('grid of %i v-cuts, n_workers=%s: %.3f s' % (len(lines), n_workers, time() - t0))
+    print('measured std:\n', std.round(2))
+    print('surface residual std: %.3f' % surface.residual_std)
+
+    plt.figure('grid')
+    plt.imshow(img_masked)
+    for x0, y0, x1, y1 in lines:
+        plt.plot((x0, x1), (y0, y1))
+    plt.figure('std surface')
+    plt.imshow(surface_map)
+    plt.colorbar()
+    plt.show()
@@ -0,0 +1,285 @@
+'''
+live image sharpness of a v-cut in a stream of frames (e.g. camera feed during lens focusing)
+
+    >>> stream = SharpnessStream(line)
+    >>> for out in stream(latestFrames(videoFrames(0))):
+    ...     print(out['std_smooth'])
+
+the alignment of the v-cut (image window, remap tables, background, v_isDark) is kept between frames
+(see fixture.VcutFixture) and only detected again if the v-cut is lost.
+The v-cut edges are fitted in every frame: the fitted edges depend on blur and the
+calibration assumes edges fitted in the same image - reusing edges fitted 5% sharper
+changes fres by 3%. Fitting within the aligned window is cheap.
+Measured resolution factors are smoothed with a Kalman filter or an exponential moving average.
+latestFrames reads frames in a thread and always returns the newest one,
+so a slow consumer skips frames instead of falling behind (bounded latency).
+'''
+
+import threading
+from time import perf_counter
+
+import numpy as np
+
+# local
+from fixture import VcutFixture
+from resolutionFactor import resolutionFactor
+from utils.transforms import resFactor2std
+
+
+class EMAFilter(object):
+    '''
+    exponential moving average
+    alpha ... weight of new value (1 -> no smoothing)
+    '''
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        self.value = np.nan
+
+    def update(self, z):
+        '''
+        add measurement [z] (NaN is ignored), returns smoothed value
+        '''
+        if np.isfinite(z):
+            if np.isfinite(self.value):
+                self.value += self.alpha * (z - self.value)
+            else:
+                self.value = float(z)
+        return self.value
+
+
+class KalmanFilter1d(object):
+    '''
+    Kalman filter of a value that changes as a random walk (e.g. while focusing)
+
+    process_std     ... expected change of value between two frames
+    measurement_std ... noise of a single measurement
+    '''
+
+    def __init__(self, process_std=0.02, measurement_std=0.05):
+        self.q = process_std ** 2
+        self.r = measurement_std ** 2
+        self.reset()
+
+    def reset(self):
+        self.value = np.nan
+        self.variance = np.inf
+
+    def update(self, z):
+        '''
+        add measurement [z] (NaN is ignored), returns smoothed value
+        '''
+        self.variance += self.q
+        if np.isfinite(z):
+            if np.isfinite(self.value):
+                gain = self.variance / (self.variance + self.r)
+                self.value += gain * (z - self.value)
+                self.variance *= 1 - gain
+            else:
+                self.value = float(z)
+                self.variance = self.r
+        return self.value
+
+
+class SharpnessStream(object):
+    '''
+    measure resolution factor and std of every frame,
+    v-cut alignment is reused (warm start) and only detected again if the v-cut is lost
+
+    line, img_bg, max_width, mask_is_dark, v_isDark, dtype ... see measure.measureVcut
+    img_unmasked ... unmasked image, same for all frames, contrast is normalized if None
+    smoothing    ... 'kalman' (see KalmanFilter1d), 'ema' (see EMAFilter) or None
+    kwargs       ... passed to filter, e.g. alpha=0.5 or measurement_std=0.1
+    '''
+
+    def __init__(self, line, img_unmasked=None, img_bg=None, max_width=101,
+                 mask_is_dark=False, v_isDark=None, dtype=np.float32,
+                 smoothing='kalman', **kwargs):
+        self.img_unmasked = img_unmasked
+        self.fixture = VcutFixture(line, img_bg, max_width, mask_is_dark, v_isDark,
+                                   refit_every=1, dtype=dtype)
+        if smoothing == 'kalman':
+            self.filter = KalmanFilter1d(**kwargs)
+        elif smoothing == 'ema':
+            self.filter = EMAFilter(**kwargs)
+        elif smoothing is None:
+            self.filter = EMAFilter(alpha=1)
+        else:
+            raise ValueError("smoothing has to be 'kalman', 'ema' or None")
+        self.n_frames = 0
+
+    def update(self, frame, t_frame=None):
+        '''
+        measure one frame (2d, or BGR which is converted to gray)
+        t_frame ... time.perf_counter() when the frame was captured (used for latency)
+
+        returns {'frame', 'fres', 'std', 'fres_smooth', 'std_smooth',
+                 'drift', 't_measure', 'latency'}
+            drift ... shift [px] of v-cut edges since last frame
+            times in s
+        '''
+        t0 = perf_counter()
+        if frame.ndim == 3:
+            import cv2
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        try:
+            fres = float(resolutionFactor(*self.fixture.measure(frame, self.img_unmasked)[0]))
+        except Exception:
+            # v-cut not found (e.g. moved out of window): detect geometry again in next frame
+            fres = np.nan
+            self.fixture.shape = None
+        fres_smooth = self.filter.update(fres)
+        t1 = perf_counter()
+        self.n_frames += 1
+        return {'frame': self.n_frames - 1,
+                'fres': fres,
+                'std': float(resFactor2std(fres)) if np.isfinite(fres) else np.nan,
+                'fres_smooth': fres_smooth,
+                'std_smooth': (float(resFactor2std(fres_smooth))
+                               if np.isfinite(fres_smooth) else np.nan),
+                'drift': self.fixture.last_drift,
+                't_measure': t1 - t0,
+                'latency': t1 - (t0 if t_frame is None else t_frame)}
+
+    def __call__(self, frames):
+        '''
+        generator of update() results for all [frames]
+        frames ... iterable of images or (image, capture time) as returned by latestFrames
+        '''
+        for frame in frames:
+            if isinstance(frame, tuple):
+                yield self.update(*frame)
+            else:
+                yield self.update(frame)
+
+
+def videoFrames(source):
+    '''
+    frames of a video file or camera device (cv2.VideoCapture)
+    source ... file path or device number
+    '''
+    import cv2
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise IOError("can't open video source %r" % (source,))
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def latestFrames(frames):
+    '''
+    read [frames] in a background thread, yield only the newest frame
+    with its capture time (time.perf_counter()), older unread frames are dropped
+
+    use for live sources, so processing never falls behind the camera
+    the reader stops and closes [frames] (e.g. releases the camera of videoFrames)
+    when the consumer stops iterating
+    '''
+    cond = threading.Condition()
+    stop = threading.Event()
+    state = {'frame': None, 'done': False, 'error': None}
+
+    def read():
+        try:
+            for frame in frames:
+                if stop.is_set():
+                    break
+                with cond:
+                    state['frame'] = (frame, perf_counter())
+                    cond.notify()
+        except Exception as e:
+            state['error'] = e
+        finally:
+            # the generator is closed in the thread that runs it:
+            if hasattr(frames, 'close'):
+                frames.close()
+            with cond:
+                state['done'] = True
+                cond.notify()
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    try:
+        while True:
+            with cond:
+                while state['frame'] is None and not state['done']:
+                    cond.wait()
+                frame, state['frame'] = state['frame'], None
+                done = state['done']
+            if frame is not None:
+                yield frame
+            elif done:
+                if state['error'] is not None:
+                    raise state['error']
+                return
+    finally:
+        stop.set()
+        reader.join()
+
+
+def _demoFrames(n, shape=(1944, 2592), std=(1, 3), rng=None):
+    '''
+    synthetic 5 MP uint8 frames with a v-cut blurred with std changing from std[0] to std[1]
+    (focus sweep), returns frames, unmasked frame, line, stds
+    '''
+    from generate import patVcut
+    rng = np.random.default_rng(rng)
+    size = 501
+    stds = np.linspace(std[0], std[1], 8)
+    patches = [patVcut(s, phi=0.3, angle_rad=0.08, size=size, SNR=1e6, rng=rng) for s in stds]
+    line = np.array(patches[0][2]) + (1000, 700, 1000, 700)
+    noise = rng.random((4,) + shape) * 8
+    frames, frame_stds = [], []
+    for i in range(n):
+        frame = noise[i % 4] + 20
+        j = int(i * len(stds) / n)
+        frame[700:700 + size, 1000:1000 + size] += 200 * patches[j][0]
+        frames.append(frame.astype(np.uint8))
+        frame_stds.append(stds[j])
+    unmasked = (noise[0] + 220).astype(np.uint8)
+    return frames, unmasked, line, frame_stds
+
+
+if __name__ == '__main__':
+    import argparse
+    from fromFile import parseLine
+
+    parser = argparse.ArgumentParser(description='live image sharpness of a v-cut in a video')
+    parser.add_argument('source', type=str, nargs='?', default=None,
+                        help='video file or camera device number, synthetic 5 MP frames if not given')
+    parser.add_argument('line', type=str, nargs='?', default=None, help='x0,y0,x1,y1')
+    parser.add_argument('-w', '--max_width', type=int, default=101, help='Maximum width [px] of v-cut')
+    parser.add_argument('-s', '--smoothing', type=str, default='kalman', help="'kalman' or 'ema'")
+    parser.add_argument('--mask_not_dark', dest='mask_is_dark', action='store_false',
+                        help='use flag, if mask if not completely opaque')
+    args = parser.parse_args()
+
+    unmasked = None
+    if args.source is None:
+        frames, unmasked, line, stds = _demoFrames(120, rng=0)
+        source = iter(frames)
+    else:
+        line = parseLine(args.line)
+        source = latestFrames(videoFrames(int(args.source) if args.source.isdigit()
+                                          else args.source))
+    stream = SharpnessStream(line, unmasked, max_width=args.max_width,
+                             mask_is_dark=args.mask_is_dark, smoothing=args.smoothing)
+    t0 = perf_counter()
+    times = []
+    for out in stream(source):
+        times.append(out['t_measure'])
+        print('%5i fres %6.3f  smoothed %6.3f  std %6.3f  smoothed %6.3f  %.1f ms' % (
+            out['frame'], out['fres'], out['fres_smooth'], out['std'], out['std_smooth'],
+            1e3 * out['t_measure']))
+    t = np.array(times)
+    print('%i frames, %.1f frames/s, time per frame: median %.2f ms, max %.2f ms' % (
+        len(t), len(t) / (perf_counter() - t0), 1e3 * np.median(t), 1e3 * t.max()))
@@ -0,0 +1,94 @@
+'''
+run v-cut measurements on synthetic patterns for many standard deviations
+in parallel processes
+
+every measurement gets its own random generator derived from one seed,
+so results are the same no matter how many processes are used
+'''
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# local
+from generate import patVcut, randAngle_rad
+from measure import measureVcut
+from resolutionFactor import resolutionFactor
+from utils.findXAt import findCrossing
+from utils.transforms import resFactor2std
+
+
+def _pattern(std, rng, angle_deg=None, **kwargs):
+    # angle_deg ... (low, high) range of random v-cut angle [degrees]
+    if angle_deg is not None:
+        kwargs['angle_rad'] = randAngle_rad(*angle_deg, rng=rng)
+    return patVcut(std, rng=rng, **kwargs)
+
+
+def uncorrectedResolutionFactor(std, rng, **kwargs):
+    '''
+    measure v-cut angle * distance to half contrast for
+    synthetic pattern blurred with [std]
+    kwargs ... passed to generate.patVcut, additionally angle_deg=(low, high)
+    '''
+    img_masked, img_unmasked, line = _pattern(std, rng, **kwargs)
+    r, y, calc_angle = measureVcut(img_masked, line=line, img_unmasked=img_unmasked)[0]
+    return calc_angle * findCrossing(r, y, 0.5)
+
+
+def measuredStd(std, rng, dtype=float, **kwargs):
+    '''
+    measure std (from resolution factor) for
+    synthetic pattern blurred with [std]
+    dtype ... compute dtype of measureVcut
+    '''
+    img_masked, img_unmasked, line = _pattern(std, rng, **kwargs)
+    r, y, calc_angle = measureVcut(img_masked, line=line, img_unmasked=img_unmasked,
+                                   dtype=dtype)[0]
+    return resFactor2std(resolutionFactor(r, y, calc_angle))
+
+
+def _run(task):
+    fn, std, seed, kwargs = task
+    return fn(std, np.random.default_rng(seed), **kwargs)
+
+
+def sweep(fn, stds, n_repeat=1, seed=0, n_workers=None, seed_per_std=False, **kwargs):
+    '''
+    fn        ... function(std, rng, **kwargs), e.g. measuredStd
+                  needs to be defined on module level to be used in other processes
+    stds      ... standard deviations
+    n_repeat  ... number of measurements per std
+    seed      ... root seed of all random generators
+    n_workers ... number of processes, all available cores if None,
+                  run in this process if 1
+    seed_per_std ... derive random generators from [seed] and std value instead of position,
+                     so results of one std don't depend on the other [stds]
+                     and the first n repetitions are the same for any n_repeat >= n
+    kwargs    ... passed to fn
+
+    returns array (len(stds), n_repeat) of fn results
+    '''
+    if seed_per_std:
+        seeds = [s for std in stds
+                 for s in np.random.SeedSequence((seed, int(round(std * 1e6)))).spawn(n_repeat)]
+    else:
+        seeds = np.random.SeedSequence(seed).spawn(len(stds) * n_repeat)
+    tasks = [(fn, std, seeds[i * n_repeat + j], kwargs)
+             for i, std in enumerate(stds) for j in range(n_repeat)]
+    if n_workers == 1:
+        out = [_run(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(n_workers) as pool:
+            out = list(pool.map(_run, tasks, chunksize=max(1, n_repeat // 2)))
+    return np.array(out).reshape(len(stds), n_repeat)
+
+
+if __name__ == '__main__':
+    from time import time
+
+    stds = np.linspace(0.5, 5, 8)
+    for n_workers in (1, None):
+        t0 = time()
+        out = sweep(measuredStd, stds, n_repeat=4, n_workers=n_workers)
+        print('n_workers=%s: %.2f s' % (n_workers, time() - t0))
+        print(out.mean(axis=1))
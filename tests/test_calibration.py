@@ -0,0 +1,33 @@
+import pytest
+
+from utils.calibration import CalibrationStore, DEFAULT_COEFFS, DEFAULT_PARAMS
+
+
+def test_vcut_needs_relation_it_was_fitted_with(tmp_path):
+    store = CalibrationStore(str(tmp_path / 'calibration.json'))
+    relation = DEFAULT_PARAMS['relation']
+    store.setCoeffs('relation', relation, activate=True, std2fres_bigger1=1.9)
+    store.setCoeffs('vcut', DEFAULT_PARAMS['vcut'], activate=True, resolutionFactor=[2, 0.4, 0.9, 1])
+    assert store.coeffs()['resolutionFactor'] == [2, 0.4, 0.9, 1]
+
+    # new relation makes the vcut correction outdated:
+    store.setCoeffs('relation', dict(relation, size=500), activate=True, std2fres_bigger1=1.8)
+    with pytest.raises(ValueError):
+        store.coeffs()
+    assert store.coeffs(kinds=('relation',))['std2fres_bigger1'] == 1.8
+    # refit with the new relation:
+    store.setCoeffs('vcut', DEFAULT_PARAMS['vcut'], resolutionFactor=[2, 0.4, 0.9, 1.1])
+    assert store.coeffs()['resolutionFactor'] == [2, 0.4, 0.9, 1.1]
+
+
+def test_default_vcut_needs_default_relation(tmp_path):
+    store = CalibrationStore(str(tmp_path / 'calibration.json'))
+    assert store.coeffs() == DEFAULT_COEFFS
+    store.setCoeffs('relation', dict(DEFAULT_PARAMS['relation'], size=500), activate=True,
+                    std2fres_bigger1=1.8)
+    # default vcut coefficients are outdated by any active relation:
+    with pytest.raises(ValueError):
+        store.coeffs()
+    assert store.coeffs(kinds=('relation',))['std2fres_bigger1'] == 1.8
+    store.setCoeffs('vcut', DEFAULT_PARAMS['vcut'], activate=True, resolutionFactor=[2, 0.4, 0.9, 1])
+    assert store.coeffs()['resolutionFactor'] == [2, 0.4, 0.9, 1]
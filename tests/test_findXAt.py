@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from generate import patVcut
+from measure import measureVcut
+from utils.findXAt import findCrossing, findXAt
+
+
+@pytest.fixture(scope='module')
+def profiles():
+    # (radii, contrasts, masked_only)
+    rng = np.random.default_rng(0)
+    out = []
+    for std in np.linspace(0.5, 5, 20):
+        img_masked, img_unmasked, line = patVcut(std, rng=rng)
+        out.append(measureVcut(img_masked, line, img_unmasked)[0][:2] + (False,))
+    # without unmasked image profiles are normalized (measure.normalizeProfile):
+    rng = np.random.default_rng(1)
+    for std in np.linspace(0.5, 5, 40):
+        img_masked, _, line = patVcut(std, rng=rng)
+        out.append(measureVcut(img_masked, line)[0][:2] + (True,))
+    return out
+
+
+def test_crossing_matches_spline(profiles):
+    # local cubic vs. global spline interpolation of measured v-cut profiles
+    # bounds are given in README.md
+    for r, c, masked_only in profiles:
+        r50 = findXAt(r, c, 0.5)
+        if masked_only:
+            assert abs(findCrossing(r, c, 0.5) - r50) <= 0.015 * r50
+        else:
+            assert abs(findCrossing(r, c, 0.5) - r50) <= 0.12
+            assert abs(findCrossing(r, c, 0.5) - r50) <= 0.0025 * r50
+
+
+def test_crossing_batch(profiles):
+    # NaN padded (B,N) curves give the same result as single curves
+    n = max(len(r) for r, _, _ in profiles)
+    rr = np.full((len(profiles), n), np.nan)
+    cc = np.full((len(profiles), n), np.nan)
+    for i, (r, c, _) in enumerate(profiles):
+        rr[i, :len(r)] = r
+        cc[i, :len(c)] = c
+    single = [findCrossing(r, c, 0.5) for r, c, _ in profiles]
+    assert np.allclose(findCrossing(rr, cc, 0.5), single)
+
+
+def test_no_crossing():
+    x = np.linspace(-3, 3, 100)
+    y = x ** 2 - 5
+    assert abs(findCrossing(x, y, 0) - findXAt(x, y, 0)) < 1e-6
+    # spline based findXAt raises IndexError, findCrossing returns NaN:
+    with pytest.raises(IndexError):
+        findXAt(x, y, 100)
+    assert np.isnan(findCrossing(x, y, 100))
+    assert np.isnan(findCrossing(np.broadcast_to(x, (2, 100)), [y, y], 100)).all()
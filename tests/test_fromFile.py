@@ -0,0 +1,17 @@
+import os
+
+from fromFile import entriesFromSource
+
+
+def test_manifest_paths(tmp_path):
+    # manifest paths are relative to the manifest, command line paths to the working directory
+    manifest = tmp_path / 'list.csv'
+    manifest.write_text('masked,line,background\n'
+                        'a.png,"1,2,3,4",bg.png\n'
+                        'b.png,"1,2,3,4",\n')
+    entries = entriesFromSource(str(manifest), unmasked='unmasked.png', background='bg0.png')
+    assert entries[0]['masked'] == os.path.join(str(tmp_path), 'a.png')
+    assert entries[0]['background'] == os.path.join(str(tmp_path), 'bg.png')
+    assert entries[0]['unmasked'] == 'unmasked.png'
+    assert entries[1]['background'] == 'bg0.png'
+    assert entries[1]['line'] == [1, 2, 3, 4]
@@ -0,0 +1,16 @@
+import numpy as np
+
+from generate import iterPatVcut
+
+
+def test_iterPatVcut_per_pattern_params():
+    n = 10
+    phi = np.linspace(0, 1, n)
+    angle_rad = np.linspace(0.05, 0.1, n)
+    SNR = np.linspace(20, 40, n)
+    truth = [dict((k, v.copy()) for k, v in batch[3].items())
+             for batch in iterPatVcut(n, 4, std=np.linspace(1, 3, n), phi=phi,
+                                      angle_rad=angle_rad, SNR=SNR, size=51, rng=0)]
+    assert [len(t['phi']) for t in truth] == [4, 4, 2]
+    for key, val in (('phi', phi), ('angle_rad', angle_rad), ('SNR', SNR)):
+        assert np.array_equal(np.concatenate([t[key] for t in truth]), val)
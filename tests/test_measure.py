@@ -0,0 +1,49 @@
+import os
+
+import cv2
+import numpy as np
+
+from generate import patVcutBatch
+from measure import measureVcut, measureVcutStack
+from resolutionFactor import resolutionFactor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _stackFres(out, i):
+    (r, y, angle), _, _ = out
+    valid = ~np.isnan(r[i])
+    return resolutionFactor(r[i][valid], y[i][valid], angle[i])
+
+
+def test_stack_uint8_sample():
+    # integer images have to be converted to float before warping
+    img = cv2.imread(os.path.join(ROOT, 'masked.png'), cv2.IMREAD_GRAYSCALE)
+    with open(os.path.join(ROOT, 'line.txt')) as f:
+        line = [float(v) for v in f.read().split(',')]
+    single = resolutionFactor(*measureVcut(img, line, mask_is_dark=True)[0])
+    stacked = _stackFres(measureVcutStack(img[np.newaxis], line, mask_is_dark=True), 0)
+    assert abs(stacked - single) < 1e-6 * single
+
+
+def _assertStackMatchesSingle(masked, lines, unmasked=None):
+    out = measureVcutStack(masked, lines, unmasked)
+    for i in range(len(masked)):
+        vals = measureVcut(masked[i], lines[i], None if unmasked is None else unmasked[i])[0]
+        single = resolutionFactor(*vals)
+        assert abs(_stackFres(out, i) - single) < 1e-6 * single
+        assert abs(out[0][2][i] - vals[2]) < 1e-6 * vals[2]
+
+
+def test_stack_batch():
+    # lines of different length, shorter ones are padded
+    masked, unmasked, lines, _ = patVcutBatch(8, 2, size=501, rng=1, dtype=float)
+    _assertStackMatchesSingle(masked, lines, unmasked)
+    _assertStackMatchesSingle(masked, lines)
+
+
+def test_stack_uint8_batch():
+    masked, unmasked, lines, _ = patVcutBatch(8, 2, size=501, rng=1)
+    masked = (masked * 200).astype(np.uint8)
+    unmasked = (unmasked * 200).astype(np.uint8)
+    _assertStackMatchesSingle(masked, lines, unmasked)
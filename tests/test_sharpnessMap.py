@@ -0,0 +1,43 @@
+import numpy as np
+
+from generate import patVcutBatch
+from measure import measureVcut
+from resolutionFactor import resolutionFactor
+from sharpnessMap import measureVcuts, measureTiles
+
+
+def _frame():
+    # 2x2 v-cuts in one uint16 image
+    masked, unmasked, lines, _ = patVcutBatch(4, 2, size=301, rng=0, dtype=float)
+    img_masked = np.empty((602, 602), dtype=np.uint16)
+    img_unmasked = np.empty_like(img_masked)
+    out = []
+    for i, line in enumerate(lines):
+        y0, x0 = divmod(i, 2)
+        y0 *= 301
+        x0 *= 301
+        img_masked[y0:y0 + 301, x0:x0 + 301] = masked[i] * 1000 + 100
+        img_unmasked[y0:y0 + 301, x0:x0 + 301] = unmasked[i] * 1000 + 100
+        out.append((line[0] + x0, line[1] + y0, line[2] + x0, line[3] + y0))
+    return img_masked, img_unmasked, out
+
+
+def test_vcuts_match_tiles():
+    img_masked, img_unmasked, lines = _frame()
+    single = [resolutionFactor(*measureVcut(img_masked, line, img_unmasked, 100)[0])
+              for line in lines]
+    results = measureVcuts(img_masked, lines, img_unmasked, 100, n_workers=2)
+    fres = [resolutionFactor(*res[0]) for res in results]
+    tiles = measureTiles(img_masked, lines, img_unmasked, 100, n_workers=1)
+    np.testing.assert_allclose(fres, single, rtol=1e-9)
+    np.testing.assert_allclose(tiles, single, rtol=1e-9)
+
+
+def test_vcuts_float32():
+    img_masked, img_unmasked, lines = _frame()
+    results = measureVcuts(img_masked, lines, img_unmasked, 100, dtype=np.float32)
+    assert all(res[2][0].dtype == np.float32 for res in results)
+    fres = [resolutionFactor(*res[0]) for res in results]
+    single = [resolutionFactor(*measureVcut(img_masked, line, img_unmasked, 100)[0])
+              for line in lines]
+    np.testing.assert_allclose(fres, single, rtol=1e-4)
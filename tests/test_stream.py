@@ -0,0 +1,30 @@
+import threading
+
+from stream import latestFrames
+
+
+def test_latestFrames_closes_source():
+    closed = threading.Event()
+
+    def source():
+        # endless camera
+        try:
+            i = 0
+            while True:
+                yield i
+                i += 1
+        finally:
+            closed.set()
+
+    frames = latestFrames(source())
+    for frame, t in frames:
+        if frame > 3:
+            break
+    frames.close()
+    assert closed.is_set()
+
+
+def test_latestFrames_reads_all():
+    frames = [frame for frame, t in latestFrames(iter(range(5)))]
+    assert frames[-1] == 4
+    assert frames == sorted(frames)
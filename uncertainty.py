@@ -0,0 +1,143 @@
+'''
+confidence intervals of a v-cut measurement from a single image
+
+the per-column edge positions (see measure.vcutEdges) and the noise of the
+contrast profile are resampled in a bootstrap. All replicates are processed at once:
+    edges   ... columns are drawn with replacement, the drawn counts are used as
+                weights in one robustLinregressStack call for all replicates
+    profile ... every replicate samples the contrast image along its own middle line
+                (one map_coordinates call), noise is resampled from the residuals
+                of a smoothed profile (residual bootstrap)
+so hundreds of replicates cost only a few single measurements.
+'''
+
+import numpy as np
+from scipy.ndimage import map_coordinates
+
+# local
+from measure import measureVcut, normalizeProfiles, vcutEdges
+from resolutionFactor import resolutionFactor
+from utils.robustLinregress import robustLinregressStack
+from utils.stageStats import stages
+from utils.transforms import resFactor2std
+
+
+def measureVcutUncertainty(img_masked, line, img_unmasked=None, img_bg=None,
+                           max_width=101,
+                           mask_is_dark=False,
+                           v_isDark=None,
+                           n_boot=200,
+                           confidence=0.95,
+                           window=11,
+                           rng=None,
+                           stats=None):
+    '''
+    measure v-cut (see measure.measureVcut) with bootstrap confidence intervals
+
+    n_boot     ... number of bootstrap replicates
+    confidence ... confidence level of percentile intervals
+    window     ... window size [px] of Savitzky-Golay filter separating profile from noise
+    rng        ... numpy random generator or seed
+
+    returns {'fres', 'std', 'angle'}: (value, low, high),
+            replicates {'fres', 'std', 'angle'}: (n_boot,)
+    '''
+    from scipy.signal import savgol_coeffs, savgol_filter  # slow import
+    rng = np.random.default_rng(rng)
+    stage = stages(stats)
+
+    (r, y, angle), fitlines, (contrast_img, dsub) = measureVcut(
+        img_masked, line, img_unmasked, img_bg, max_width, mask_is_dark, v_isDark, stats)
+    fres = resolutionFactor(r, y, angle)
+
+    with stage('bootstrap edges'):
+        xx, line1, line3 = vcutEdges(contrast_img, dsub)
+        n = len(xx)
+        # number of times every column is drawn:
+        draws = rng.integers(0, n, (n_boot, n)) + n * np.arange(n_boot)[:, np.newaxis]
+        counts = np.bincount(draws.ravel(), minlength=n_boot * n).reshape(n_boot, n)
+        # upper and lower edge of all replicates at once,
+        # both edges are resampled at the same columns:
+        m, c = robustLinregressStack(xx, np.concatenate((np.broadcast_to(line1, (n_boot, n)),
+                                                         np.broadcast_to(line3, (n_boot, n)))),
+                                     np.concatenate((counts, counts)))
+        m1, m3 = m[:n_boot], m[n_boot:]
+        n1, n3 = c[:n_boot], c[n_boot:]
+
+    with stage('bootstrap profile'):
+        x = np.arange(contrast_img.shape[1])
+        fitline2 = 0.5 * (x * (m1 + m3)[:, np.newaxis] + (n1 + n3)[:, np.newaxis])
+        # first row: middle line of measurement
+        fitline2 = np.concatenate((fitlines[1][np.newaxis], fitline2))
+        yb = map_coordinates(contrast_img, [fitline2, np.broadcast_to(x, fitline2.shape)],
+                             order=2)
+        y0, yb = yb[0], yb[1:]
+
+        # residuals of measured profile, scaled by leverage of filter:
+        window = min(window, len(x) - (len(x) + 1) % 2)
+        h = savgol_coeffs(window, 3)[window // 2]
+        res = (y0 - savgol_filter(y0, window, 3)) / (1 - h) ** 0.5
+        res = res[len(x) - len(y):]  # only in front of intersection
+        yb = savgol_filter(yb, window, 3, axis=1)
+        yb += res[rng.integers(0, len(res), yb.shape)]
+
+        # Intersection and angle of replicate lines:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            i0 = (n3 - n1) / (m1 - m3)
+        i1 = m1 * i0 + n1
+        cos = (1 + m1 * m3) / (np.hypot(1, m1) * np.hypot(1, m3))
+        angleb = np.arccos(cos.clip(-1, 1))
+        rb = np.hypot(x - i0[:, np.newaxis], fitline2[1:] - i1[:, np.newaxis])
+        # exclude area behind intersection:
+        dx = x - i0[:, np.newaxis]
+        behind = x < np.argmax(dx > 0, axis=1)[:, np.newaxis]
+        rb[behind] = np.nan
+        yb[behind] = np.nan
+        if img_unmasked is None:
+            normalizeProfiles(yb)
+
+    with stage('bootstrap fres'):
+        fresb = resolutionFactor(rb, yb, angleb)
+        stdb = resFactor2std(fresb)
+
+    replicates = {'fres': fresb, 'std': stdb, 'angle': angleb}
+    q = 50 * (1 - confidence), 50 * (1 + confidence)
+    out = {}
+    for name, value in (('fres', fres), ('std', resFactor2std(fres)), ('angle', angle)):
+        low, high = np.nanpercentile(replicates[name], q)
+        out[name] = (float(value), float(low), float(high))
+    return out, replicates
+
+
+if __name__ == '__main__':
+    # compare bootstrap intervals with the spread of repeated measurements
+    from time import perf_counter
+
+    from generate import patVcut
+
+    rng = np.random.default_rng(0)
+    std, phi, angle_rad = 2, 0.3, np.radians(4.5)
+    img_masked, img_unmasked, line = patVcut(std, phi=phi, angle_rad=angle_rad, rng=rng)
+
+    measureVcutUncertainty(img_masked, line, img_unmasked, rng=1)  # import scipy.signal
+    t0 = perf_counter()
+    measureVcut(img_masked, line, img_unmasked)
+    t1 = perf_counter()
+    out, replicates = measureVcutUncertainty(img_masked, line, img_unmasked, rng=1)
+    t2 = perf_counter()
+    print('time: measureVcut %.1f ms, with 200 bootstrap replicates %.1f ms' % (
+        1e3 * (t1 - t0), 1e3 * (t2 - t1)))
+    for name, (value, low, high) in out.items():
+        print('%-6s %.4f  95%% interval: %.4f ... %.4f  (bootstrap std: %.4f)' % (
+            name, value, low, high, np.nanstd(replicates[name])))
+
+    # same blur and angle, new noise:
+    vals = []
+    for _ in range(50):
+        img_masked, img_unmasked, line = patVcut(std, phi=phi, angle_rad=angle_rad, rng=rng)
+        r, y, angle = measureVcut(img_masked, line, img_unmasked)[0]
+        fres = resolutionFactor(r, y, angle)
+        vals.append((fres, resFactor2std(fres), angle))
+    print('std of 50 repeated measurements (new noise):')
+    for name, v in zip(('fres', 'std', 'angle'), np.array(vals).T):
+        print('%-6s %.4f' % (name, v.std()))
@@ -18,7 +18,20 @@ def alignImageAlongLine(img, line, height=15, length=None,
     @param fast - speed up calculation using nearest neighbour interpolation
     @returns transformed image as numpy.2darray with found line as in the middle
     '''
+    M, dsize = alignTransform(line, height, length, zoom, allow_mirror)
+    dst = cv2.warpAffine(
+        img, M, dsize,
+        flags=cv2.INTER_NEAREST if fast else cv2.INTER_LINEAR,
+        **cv2Opts)
+    return dst
+
 
+def alignTransform(line, height=15, length=None, zoom=1, allow_mirror=True):
+    '''
+    affine transformation used in alignImageAlongLine
+
+    @returns 2x3 transformation matrix, (output width, output height)
+    '''
     height = int(round(height))
     if height % 2 == 0:  # ->is even number
         height += 1  # only take uneven numbers to have line in middle
@@ -52,11 +65,31 @@ def alignImageAlongLine(img, line, height=15, length=None,
    
     # TRANSFORM:
     M = cv2.getAffineTransform(pts1, pts2)
-    dst = cv2.warpAffine(
-        img, M, (length, height),
-        flags=cv2.INTER_NEAREST if fast else cv2.INTER_LINEAR,
-        **cv2Opts)
-    return dst
+    return M, (length, height)
+
+
+def alignBoundingBox(line, height=15, length=None, zoom=1, allow_mirror=True,
+                     shape=None, border=2):
+    '''
+    bounding box of all pixels needed for alignImageAlongLine
+
+    @param shape - image shape (s0, s1) to clip the bounding box to
+    @param border - additional pixels around the box (needed for interpolation)
+    @returns x0, y0, x1, y1 - use img[y0:y1, x0:x1]
+    '''
+    M, (w, h) = alignTransform(line, height, length, zoom, allow_mirror)
+    Mi = cv2.invertAffineTransform(M)
+    corners = np.array(((0, 0, 1), (w - 1, 0, 1), (0, h - 1, 1), (w - 1, h - 1, 1)))
+    x, y = Mi.dot(corners.T)
+    x0 = int(np.floor(x.min())) - border
+    y0 = int(np.floor(y.min())) - border
+    x1 = int(np.ceil(x.max())) + border + 1
+    y1 = int(np.ceil(y.max())) + border + 1
+    if shape is not None:
+        s0, s1 = shape
+        x0, x1 = np.clip((x0, x1), 0, s1)
+        y0, y1 = np.clip((y0, y1), 0, s0)
+    return int(x0), int(y0), int(x1), int(y1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,77 @@
+'''
+fast blur of images with a point spread function (psf),
+same output as scipy.signal.convolve2d(img, psf, mode='same', boundary='symm')
+'''
+
+import cv2
+import numpy as np
+
+# local
+from utils.transforms import std2Kernel1d
+
+
+def blur(img, std=None, psf=None, k=9):
+    '''
+    std ... standard deviation of Gaussian blur kernel - optionally different in y,x
+            -> separable convolution with 1d kernels
+    psf ... arbitrary blur kernel (2d numpy array)
+            -> convolution via FFT
+    k   ... kernel size in multiples of std (see transforms.std2PSF)
+    '''
+    assert std is not None or psf is not None, "either std or psf have to be provided"
+    if psf is not None:
+        return blurPSF(img, psf)
+    return blurGaussian(img, std, k)
+
+
+def blurGaussian(img, std, k=9, dst=None):
+    '''
+    blur with Gaussian kernel using two 1d convolutions
+    dst ... optional output array
+    '''
+    ky, kx = std2Kernel1d(std, k)
+    # kernels are symmetric, so correlation == convolution:
+    return cv2.sepFilter2D(img, -1, kx, ky, dst=dst, borderType=cv2.BORDER_REFLECT)
+
+
+def blurPSF(img, psf):
+    '''
+    blur with arbitrary kernel using FFT convolution
+    '''
+    from scipy.signal import fftconvolve  # slow import, only needed here
+    # extend image symmetrically to get the same border as convolve2d(boundary='symm'):
+    pads = [(s // 2, s - 1 - s // 2) for s in psf.shape]
+    padded = np.pad(img, pads, mode='symmetric')
+    return fftconvolve(padded, psf, mode='valid')
+
+
+if __name__ == '__main__':
+    # compare speed with scipy.signal.convolve2d
+    from time import time
+    from scipy.signal import convolve2d
+    from utils.transforms import std2PSF
+
+    def timeit(fn, *args, **kwargs):
+        t0 = time()
+        out = fn(*args, **kwargs)
+        return time() - t0, out
+
+    # skip convolve2d, if there are more multiplications than:
+    max_ops = 2e9
+
+    print('size\tstd\tconvolve2d[s]\tseparable[s]\tFFT[s]\tmax. deviation')
+    for size in (501, 1001, 2001, 4001):
+        img = np.random.RandomState(0).rand(size, size)
+        for std in (0.5, 1, 2, 5, 10):
+            psf = std2PSF(std)
+            t_sep, out_sep = timeit(blurGaussian, img, std)
+            t_fft, out_fft = timeit(blurPSF, img, psf)
+            if size ** 2 * psf.size < max_ops:
+                t_dir, out_dir = timeit(convolve2d, img, psf,
+                                        mode='same', boundary='symm')
+                dev = max(abs(out_sep - out_dir).max(), abs(out_fft - out_dir).max())
+                print('%i\t%.1f\t%.4f\t\t%.4f\t\t%.4f\t%.1e' % (
+                    size, std, t_dir, t_sep, t_fft, dev))
+            else:
+                print('%i\t%.1f\t-\t\t%.4f\t\t%.4f\t%.1e' % (
+                    size, std, t_sep, t_fft, abs(out_sep - out_fft).max()))
@@ -0,0 +1,201 @@
+'''
+versioned on-disk store of calibration coefficients and the sweep points they are fitted to
+
+two kinds of calibration entries exist, each keyed by the parameters that created it:
+    'relation' ... std <-> resolution factor (see relation_resolutionFactor_vs_std.py)
+                   coefficients 'std2fres_bigger1', 'std2fres_smaller1' used in utils.transforms
+    'vcut'     ... correction of measured resolution factor (see get_fres_coeffs.py)
+                   for synthetic v-cuts of given size, SNR, angle range and noise model,
+                   coefficients 'resolutionFactor' used in resolutionFactor.py
+                   they are fitted via the 'relation' calibration (resFactor2std), so the
+                   relation active during the fit is recorded and has to be active when used,
+                   default coefficients are fitted with the default relation (no active entry)
+
+sweep points are stored per entry, so changing the sweep grid or the number of repetitions
+only calculates missing points, changing the generator parameters creates a new entry.
+
+The store is a JSON file (calibration.json in the project directory or
+environment variable VCUT_CALIBRATION). Without store, the default coefficients are used.
+'''
+
+import hashlib
+import json
+import os
+from copy import deepcopy
+
+# increase if changes of measurement or pattern generation alter calibration results:
+VERSION = 1
+
+PATH = os.environ.get('VCUT_CALIBRATION',
+                      os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   'calibration.json'))
+
+# coefficients used if nothing is stored:
+DEFAULT_COEFFS = {
+    'std2fres_bigger1': 1.92675391,
+    'std2fres_smaller1': [1.11308561, 0.73214517, 0.78312647, 1.42350311],
+    'resolutionFactor': [1.98784598, 0.38044078, 0.91077515, 1.00170451]}
+
+# generator parameters used to calculate default coefficients:
+DEFAULT_PARAMS = {
+    'relation': {'pattern': 'siemensStar', 'size': 1000, 'engine': 'spatial'},
+    'vcut': {'size': 501, 'SNR': 30, 'angle_deg': [3, 6], 'noise': 'uniform'}}
+
+_coeffs = None  # coefficients of active calibration
+
+
+def calibrationKey(kind, params):
+    '''
+    unique key of calibration [kind] created with generator [params] and current VERSION
+    '''
+    params = dict(params, kind=kind, version=VERSION)
+    text = json.dumps(_canonical(params), sort_keys=True)
+    return '%s-%s' % (kind, hashlib.sha1(text.encode()).hexdigest()[:12])
+
+
+def _canonical(value):
+    # same key for 30 and 30.0, (3, 6) and [3, 6]:
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def _pointKey(x):
+    return repr(round(float(x), 9))
+
+
+class CalibrationStore(object):
+    '''
+    >>> store = CalibrationStore()
+    >>> params = dict(DEFAULT_PARAMS['vcut'], SNR=50)
+    >>> values = store.points('vcut', params, 'uncorrected', stds, compute)
+    >>> store.setCoeffs('vcut', params, resolutionFactor=[...], activate=True)
+    >>> store.save()
+    '''
+
+    def __init__(self, path=None):
+        self.path = PATH if path is None else path
+        self.data = {'format': 1, 'active': {}, 'entries': {}}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.data = json.load(f)
+
+    def save(self):
+        '''
+        write store to disk (atomic - file is never half written)
+        '''
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.data, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def entry(self, kind, params):
+        '''
+        stored entry {'kind', 'params', 'version', 'coeffs', 'points'} - created if missing
+        '''
+        key = calibrationKey(kind, params)
+        entries = self.data['entries']
+        if key not in entries:
+            entries[key] = {'kind': kind, 'params': deepcopy(params), 'version': VERSION,
+                            'coeffs': {}, 'points': {}}
+        return entries[key]
+
+    def points(self, kind, params, name, xs, compute, n=None):
+        '''
+        sweep points [name] (e.g. 'uncorrected') at all positions [xs]
+        only missing points are calculated and stored (call save() to write to disk)
+
+        compute ... function(missing xs) -> one value (or list of values) per x
+        n       ... if values are lists: recalculate points with less than [n] values
+                    and only return the first [n]
+
+        returns list of values
+        '''
+        stored = self.entry(kind, params)['points'].setdefault(name, {})
+        missing = [x for x in xs if _pointKey(x) not in stored
+                   or (n is not None and len(stored[_pointKey(x)]) < n)]
+        if missing:
+            for x, value in zip(missing, compute(missing)):
+                stored[_pointKey(x)] = value
+        values = [stored[_pointKey(x)] for x in xs]
+        if n is not None:
+            values = [v[:n] for v in values]
+        return values
+
+    def setCoeffs(self, kind, params, activate=False, **coeffs):
+        '''
+        store fitted coefficients, optionally make them the active calibration
+        'vcut' coefficients are assumed to be fitted with the active 'relation' calibration
+        '''
+        entry = self.entry(kind, params)
+        entry['coeffs'].update(coeffs)
+        if kind == 'vcut':
+            # None ... default relation coefficients
+            entry['relation'] = self.data['active'].get('relation')
+        if activate:
+            self.activate(kind, params)
+
+    def activate(self, kind, params):
+        '''
+        use calibration [kind] with [params] in resolutionFactor and utils.transforms
+        '''
+        self.entry(kind, params)
+        self.data['active'][kind] = calibrationKey(kind, params)
+
+    def coeffs(self, active=None, kinds=None):
+        '''
+        coefficients of active calibrations, default coefficients for missing values
+        active ... {kind: params} - use these instead of active calibrations
+        kinds  ... only use active calibrations of these kinds (e.g. ('relation',)), all if None
+        '''
+        out = deepcopy(DEFAULT_COEFFS)
+        keys = dict(self.data['active'])
+        if active is not None:
+            keys.update({kind: calibrationKey(kind, params) for kind, params in active.items()})
+        if kinds is not None:
+            keys = {kind: key for kind, key in keys.items() if kind in kinds}
+        if 'vcut' not in keys and (kinds is None or 'vcut' in kinds) \
+                and keys.get('relation') is not None:
+            raise ValueError("default vcut coefficients were fitted with the default relation, "
+                             "active is '%s' - run get_fres_coeffs.py again" % keys['relation'])
+        for key in keys.values():
+            entry = self.data['entries'].get(key)
+            if entry is None:
+                raise KeyError("calibration '%s' is not stored in %s" % (key, self.path))
+            if entry['version'] != VERSION:
+                raise ValueError("calibration '%s' was created with version %s, current version is %s"
+                                 % (key, entry['version'], VERSION))
+            if entry['kind'] == 'vcut' and 'relation' in entry \
+                    and entry['relation'] != keys.get('relation'):
+                raise ValueError("calibration '%s' was fitted with relation calibration '%s', "
+                                 "active is '%s' - run get_fres_coeffs.py again"
+                                 % (key, entry['relation'], keys.get('relation')))
+            out.update(entry['coeffs'])
+        return out
+
+
+def coeffs():
+    '''
+    coefficients of active calibration, loaded from disk on first call
+    '''
+    global _coeffs
+    if _coeffs is None:
+        _coeffs = CalibrationStore().coeffs()
+    return _coeffs
+
+
+def use(active=None, path=None, kinds=None):
+    '''
+    switch calibration at runtime
+    active ... {kind: params}, e.g. {'vcut': dict(DEFAULT_PARAMS['vcut'], SNR=50)}
+               use active calibrations of store if None
+    path   ... store file, default: PATH
+    kinds  ... see CalibrationStore.coeffs
+    '''
+    global _coeffs
+    _coeffs = CalibrationStore(path).coeffs(active, kinds)
+    return _coeffs
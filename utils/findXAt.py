@@ -39,6 +39,86 @@ def findXAt(xArr, yArr, yVal, index=0, s=0.0):
 #         return 0.5 * (x0 + x1)
 
 
+def findCrossing(xArr, yArr, yVal, index=0, n_newton=4):
+    """
+    fast alternative to findXAt for one or many (2d array) curves
+    
+    xArr ... (N,) or (B,N), ascending
+    yArr ... (N,) or (B,N), can contain NaN (e.g. padding from measureVcutStack)
+    index ... position of crossing (return index=0 by default)
+
+    return x value(s) where y crosses yVal
+    for every crossing only the bracketing samples and their neighbours
+    are used (local cubic interpolation)
+    NaN if no crossing is found
+    """
+    yArr = np.asarray(yArr, dtype=float)
+    xArr = np.asarray(xArr, dtype=float)
+    if yArr.ndim == 1 and xArr[1] < xArr[0]:
+        xArr = xArr[::-1]
+        yArr = yArr[::-1]
+    one_curve = yArr.ndim == 1
+    yArr = np.atleast_2d(yArr) - yVal
+    xArr = np.broadcast_to(xArr, yArr.shape)
+    nb, n = yArr.shape
+
+    valid = np.isfinite(xArr) & np.isfinite(yArr)
+    y0, y1 = yArr[:, :-1], yArr[:, 1:]
+    with np.errstate(invalid='ignore'):
+        cross = ((y0 * y1 <= 0) & (y0 != y1)
+                 & valid[:, :-1] & valid[:, 1:])
+    # [index] crossing:
+    nth = cross & (np.cumsum(cross, axis=1) == index + 1)
+    found = nth.any(axis=1)
+    i = np.argmax(nth, axis=1)
+    rows = np.arange(nb)
+
+    # linear interpolation between bracketing samples:
+    xa, xb = xArr[rows, i], xArr[rows, i + 1]
+    ya, yb = yArr[rows, i], yArr[rows, i + 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x = xa - ya * (xb - xa) / (yb - ya)
+
+    # refine with cubic through 4 neighbouring samples (Newton iterations):
+    if n >= 4:
+        j = np.clip(i - 1, 0, n - 4)[:, np.newaxis] + np.arange(4)
+        xp, yp = xArr[rows[:, np.newaxis], j], yArr[rows[:, np.newaxis], j]
+        refine = found & valid[rows[:, np.newaxis], j].all(axis=1)
+        xr = x.copy()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for _ in range(n_newton):
+                f, df = _lagrange(xp, yp, xr)
+                xr -= f / df
+        # only accept refined values within bracket:
+        with np.errstate(invalid='ignore'):
+            refine &= (xr >= np.minimum(xa, xb)) & (xr <= np.maximum(xa, xb))
+        x = np.where(refine, xr, x)
+
+    x[~found] = np.nan
+    if one_curve:
+        return x[0]
+    return x
+
+
+def _lagrange(xp, yp, x):
+    """
+    value and derivative at [x] of polynomial through points (xp, yp)
+    """
+    f = 0
+    df = 0
+    k = xp.shape[1]
+    d = x[:, np.newaxis] - xp
+    for a in range(k):
+        others = [b for b in range(k) if b != a]
+        denom = np.prod([xp[:, a] - xp[:, b] for b in others], axis=0)
+        num = np.prod([d[:, b] for b in others], axis=0)
+        dnum = sum(np.prod([d[:, c] for c in others if c != b], axis=0)
+                   for b in others)
+        f = f + yp[:, a] * num / denom
+        df = df + yp[:, a] * dnum / denom
+    return f, df
+
+
 if __name__ == '__main__':
     import sys
     import pylab as plt
@@ -47,6 +127,28 @@ if __name__ == '__main__':
     y = x ** 2 - 5
     
     x0 = findXAt(x, y, 0)
+
+    # compare findCrossing with spline based findXAt on measured profiles:
+    from generate import patVcut
+    from measure import measureVcut
+
+    rng = np.random.default_rng(0)
+    dev = []
+    rel_dev = []
+    for std in np.linspace(0.5, 5, 20):
+        img_masked, img_unmasked, line = patVcut(std, rng=rng)
+        r, c = measureVcut(img_masked, line, img_unmasked)[0][:2]
+        r50 = findXAt(r, c, 0.5)
+        dev.append(abs(findCrossing(r, c, 0.5) - r50))
+        rel_dev.append(dev[-1] / r50)
+    print('max. deviation findCrossing - findXAt: %.3f px (%.2f %%)' % (
+        np.max(dev), 100 * np.max(rel_dev)))
+    # radii are sampled in 1 px steps - noisy profiles cause small differences
+    # between local and global interpolation:
+    assert np.max(dev) < 0.2
+    assert np.max(rel_dev) < 0.005
+    assert np.isnan(findCrossing(x, y, 100))
+    assert abs(findCrossing(x, y, 0) - x0) < 1e-6
     
     if 'no_window' not in sys.argv:
         
@@ -0,0 +1,127 @@
+'''
+read images at native bit depth without loading more than needed
+
+.npy files and raw sensor dumps are memory mapped,
+uncompressed TIFF files are memory mapped, tiled TIFF files only read the tiles
+of the requested region (both need the optional package tifffile),
+all other files are decoded with OpenCV
+'''
+
+import cv2
+import numpy as np
+
+RAW_EXTENSIONS = ('.raw', '.bin')
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+
+def imread(path, shape=None, dtype=None, offset=0):
+    '''
+    read grayscale image keeping its bit depth
+    returned arrays can be memory mapped or lazy (TiffTiles) -
+    slicing them only reads the requested region
+
+    path   ... image path
+    shape, dtype, offset ... (height, width), pixel type and header size [bytes]
+                             of raw sensor dumps, needed for *.raw, *.bin
+                             or if shape is given
+    '''
+    ext = path[path.rfind('.'):].lower()
+    if ext == '.npy':
+        return np.load(path, mmap_mode='r')
+    if shape is not None or ext in RAW_EXTENSIONS:
+        assert shape is not None and dtype is not None, 'raw images need shape and dtype'
+        return readRaw(path, shape, dtype, offset)
+    if ext in TIFF_EXTENSIONS:
+        img = readTiff(path)
+        if img is not None:
+            return img
+    img = cv2.imread(path, cv2.IMREAD_ANYDEPTH)
+    if img is None:
+        raise IOError("cannot read image '%s'" % path)
+    return img
+
+
+def readRaw(path, shape, dtype, offset=0):
+    '''
+    memory map raw sensor dump
+    '''
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=tuple(shape))
+
+
+def readTiff(path):
+    '''
+    memory mapped array for uncompressed TIFF files
+    TiffTiles for tiled TIFF files
+    returns None if tifffile is not installed or file is neither uncompressed nor tiled
+    '''
+    try:
+        import tifffile
+    except ImportError:
+        return None
+    try:
+        return tifffile.memmap(path, mode='r')
+    except ValueError:  # compressed or not contiguous
+        pass
+    tiles = TiffTiles(path)
+    if tiles.page.is_tiled:
+        return tiles
+    tiles.close()
+    return None
+
+
+class TiffTiles(object):
+    '''
+    array-like access to first page of a tiled TIFF file
+    tiles are only read and decoded when they intersect the requested region:
+
+    >>> img = TiffTiles('image.tif')
+    >>> sub = img[100:200, 300:500]  # numpy array
+    '''
+
+    def __init__(self, path):
+        import tifffile
+        self._file = tifffile.TiffFile(path)
+        self.page = self._file.pages[0]
+        self.shape = self.page.shape
+        self.dtype = self.page.dtype
+        self.ndim = len(self.shape)
+
+    def close(self):
+        self._file.close()
+
+    def _tiles(self, y0, y1, x0, x1):
+        # indices of all tiles within region
+        th, tw = self.page.tilelength, self.page.tilewidth
+        n_x = -(-self.shape[1] // tw)
+        return [ty * n_x + tx
+                for ty in range(y0 // th, -(-y1 // th))
+                for tx in range(x0 // tw, -(-x1 // tw))]
+
+    def __getitem__(self, index):
+        if not isinstance(index, tuple):
+            index = (index,)
+        index += (slice(None),) * (2 - len(index))
+        assert all(isinstance(i, slice) and i.step in (None, 1) for i in index[:2]), \
+            'only slices are supported'
+        (y0, y1, _), (x0, x1, _) = [i.indices(s) for i, s in zip(index[:2], self.shape)]
+        out = np.zeros((max(0, y1 - y0), max(0, x1 - x0)) + self.shape[2:], dtype=self.dtype)
+        if not out.size:
+            return out
+        page = self.page
+        fh = self._file.filehandle
+        for i in self._tiles(y0, y1, x0, x1):
+            fh.seek(page.dataoffsets[i])
+            data, indices, _ = page.decode(fh.read(page.databytecounts[i]), i)
+            ty, tx = indices[-3], indices[-2]
+            data = data.reshape(data.shape[-3:])
+            if data.shape[-1] == 1:
+                data = data[..., 0]
+            # intersection of tile and requested region:
+            sy0, sy1 = max(y0, ty), min(y1, ty + data.shape[0])
+            sx0, sx1 = max(x0, tx), min(x1, tx + data.shape[1])
+            out[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = data[sy0 - ty:sy1 - ty, sx0 - tx:sx1 - tx]
+        return out
+
+    def __array__(self, dtype=None):
+        out = self[:, :]
+        return out if dtype is None else out.astype(dtype)
@@ -5,6 +5,11 @@ various functions for lines[x0,y0,x1,y1]
 import numpy as np
 
 
+def _unpack(lines):
+    # x0, y0, x1, y1 of one line (4,) or many lines (...,4)
+    return np.moveaxis(np.asarray(lines, dtype=float), -1, 0)
+
+
 def dxdy(line):
     """
     return line slope
@@ -61,20 +66,26 @@ def pointInsidePolygon(x, y, poly):
     >>> pointInsidePolygon(1.5,1.5, poly)
     False
     """
-    n = len(poly)
-    inside = False
-    p1x, p1y = poly[0]
-    for i in range(n + 1):
-        p2x, p2y = poly[i % n]
-        if y > min(p1y, p2y):
-            if y <= max(p1y, p2y):
-                if x <= max(p1x, p2x):
-                    if p1y != p2y:
-                        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                    if p1x == p2x or x <= xinters:
-                        inside = not inside
-        p1x, p1y = p2x, p2y
-    return inside
+    return bool(pointsInsidePolygon(x, y, poly))
+
+
+def pointsInsidePolygon(x, y, poly):
+    """
+    same as pointInsidePolygon for arrays of points [x], [y] (any shape)
+    all polygon edges are tested for all points at once
+
+    returns bool array
+    """
+    x = np.asarray(x, dtype=float)[..., np.newaxis]
+    y = np.asarray(y, dtype=float)[..., np.newaxis]
+    p1x, p1y = np.asarray(poly, dtype=float).T
+    # edges from every vertex to the next one, last vertex to first one:
+    p2x, p2y = np.roll(p1x, -1), np.roll(p1y, -1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
+    crossing = ((y > np.minimum(p1y, p2y)) & (y <= np.maximum(p1y, p2y))
+                & (x <= np.maximum(p1x, p2x)) & ((p1x == p2x) | (x <= xinters)))
+    return crossing.sum(axis=-1) % 2 == 1
 
 
 def normal(line):
@@ -108,19 +119,26 @@ def fromFn(ascent, offs, length=1, px=0):
 
 def angle2(line1, line2):
     '''return smallest angle between two lines'''
+    return float(angles2(line1, line2))
+
+
+def angles2(lines1, lines2):
+    '''
+    same as angle2 for arrays of lines (...,4), e.g. (N,4) and (N,4) or (N,4) and (4,)
+    '''
     # from
     # http://stackoverflow.com/questions/13226038/calculating-angle-between-two-lines-in-python
-    x0, y0, x1, y1 = line1
-    x1 -= x0
-    y1 -= y0
-    x0, y0, x2, y2 = line2
-    x2 -= x0
-    y2 -= y0
+    x0, y0, x1, y1 = _unpack(lines1)
+    x1 = x1 - x0
+    y1 = y1 - y0
+    x0, y0, x2, y2 = _unpack(lines2)
+    x2 = x2 - x0
+    y2 = y2 - y0
     inner_product = x1 * x2 + y1 * y2
     len1 = np.hypot(x1, y1)
     len2 = np.hypot(x2, y2)
     a = inner_product / (len1 * len2)
-    return np.copysign(np.arccos(min(1, max(a, -1))), y2)
+    return np.copysign(np.arccos(np.clip(a, -1, 1)), y2)
 
 
 def isHoriz(line):
@@ -159,58 +177,72 @@ def intersection(line1, line2):
     Parameters:
     line1 and line2: lines given by 4 points (x0,y0,x1,y1).
     """
-    x1, y1, x2, y2 = line1
-    u1, v1, u2, v2 = line2
+    px, py = intersections(line1, line2)
+    if np.isnan(px):
+        return None
+    return float(px), float(py)
+
+
+def intersections(lines1, lines2):
+    """
+    same as intersection for arrays of lines (...,4)
+    returns px, py - NaN where lines are parallel, but non-colli_near
+    """
+    x1, y1, x2, y2 = _unpack(lines1)
+    u1, v1, u2, v2 = _unpack(lines2)
     (a, b), (c, d) = (x2 - x1, u1 - u2), (y2 - y1, v1 - v2)
     e, f = u1 - x1, v1 - y1
-    
+
     # Solve ((a,b), (c,d)) * (t,s) = (e,f)
-    denom = float(a * d - b * c)
-    if _near(denom, 0):
-        # parallel
-        # If colli_near, the equation is solvable with t = 0.
-        # When t=0, s would have to equal e/b and f/d
-        if b == 0:
-            yy = intersectionWithX(line1, u1)
-            if yy is None:
-                return None
-            return u1, yy
-        if d == 0:
-            xx = intersectionWithY(line1, v1)
-            if xx is None:
-                return None
-            return xx, v1
-  
-        if _near(e / b, f / d):
-            # colli_near
-            px = x1
-            py = y1
-        else:
-            # no intersection
-            return (0, 0) 
-    else:
+    denom = a * d - b * c
+    parallel = _near(denom, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
         t = (e * d - b * f) / denom
-        px = x1 + t * (x2 - x1)
-        py = y1 + t * (y2 - y1)
+        px = x1 + t * a
+        py = y1 + t * c
+        if np.any(parallel):
+            # If colli_near, the equation is solvable with t = 0.
+            # When t=0, s would have to equal e/b and f/d
+            conditions = (~parallel,
+                          b == 0,  # intersection with x=u1
+                          d == 0,  # intersection with y=v1
+                          _near(e / b, f / d))  # colli_near
+            px = np.select(conditions, (px,
+                                        np.where(a == 0, np.nan, u1),
+                                        np.where(c == 0, np.nan, x1 + (v1 - y1) * a / c),
+                                        x1), np.nan)
+            py = np.select(conditions, (py,
+                                        np.where(a == 0, np.nan, y1 + (u1 - x1) * c / a),
+                                        np.where(c == 0, np.nan, v1),
+                                        y1), np.nan)
     return px, py
 
 
 def segmentIntersection(line1, line2):
-    i = intersection(line1, line2)
-    if i is None:
+    px, py = segmentIntersections(line1, line2)
+    if np.isnan(px):
         return None
+    return float(px), float(py)
+
+
+def segmentIntersections(lines1, lines2):
+    """
+    same as segmentIntersection for arrays of lines (...,4)
+    returns px, py - NaN where segments don't intersect
+    """
+    px, py = intersections(lines1, lines2)
+    lines1, lines2 = _unpack(lines1), _unpack(lines2)
     # line1 and line2 are finite:
     # check whether intersection is on both lines:
-    if (pointIsBetween(line1[0:2], line1[2:], i)
-            and pointIsBetween(line2[0:2], line2[2:], i)):
-        return i
-    return None
+    with np.errstate(invalid='ignore'):
+        on_both = (pointIsBetween(lines1[:2], lines1[2:], (px, py))
+                   & pointIsBetween(lines2[:2], lines2[2:], (px, py)))
+    return np.where(on_both, px, np.nan), np.where(on_both, py, np.nan)
 
 
 def distancePoint(p1, p2):
-    # return ((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2) ** 0.5
-    dx = p1[1] - p2[1]
-    dy = p1[0] - p1[0]
+    dx = p1[0] - p2[0]
+    dy = p1[1] - p2[1]
     return np.hypot(dx, dy)
 
 
@@ -226,24 +258,42 @@ def pointIsBetween(startP, endP, p):
 def cutToFitIntoPolygon(line, polygon):
     """
     cut line so it fits into polygon
-    polygon = (( x0,y0), (x1,y1) ,...)
+    polygon = (( x0,y0), (x1,y1) ,...) - has to be convex, see clipLines
     """
-    p0_inside = pointInsidePolygon(line[0], line[1], polygon)
-    p1_inside = pointInsidePolygon(line[2], line[3], polygon)
-
-    if not p0_inside or not p1_inside:
-        for (i0, j0), (i1, j1) in zip(polygon[:-1], polygon[1:]):
+    return tuple(clipLines(line, polygon).tolist())
 
-            isec = segmentIntersection(line, (i0, j0, i1, j1))
 
-            if isec is not None:
-                if not p0_inside:
-                    line = (isec[0], isec[1], line[2], line[3])
-                    p0_inside = True
-                elif not p1_inside:
-                    line = (line[0], line[1], isec[0], isec[1])
-                    p1_inside = True
+def clipLines(lines, polygon):
+    """
+    cut lines (...,4) so they fit into a convex polygon
+    e.g. polygon = ((0, 0), (s1, 0), (s1, s0), (0, s0)) for an image of shape (s0, s1)
 
-            if p0_inside and p1_inside:
-                break
-    return line
+    Cyrus-Beck clipping of all lines against all polygon edges at once
+    (Liang-Barsky for rectangles). The polygon can be open or closed, in any orientation.
+    Lines completely outside of the polygon are not changed.
+    """
+    x0, y0, x1, y1 = _unpack(lines)
+    p = np.asarray(polygon, dtype=float)
+    q = np.concatenate((p[1:], p[:1]))  # next vertex
+    # inward edge normals (zero length edges don't clip):
+    orientation = np.sign((p[:, 0] * q[:, 1] - q[:, 0] * p[:, 1]).sum())
+    nx, ny = orientation * (p[:, 1] - q[:, 1]), orientation * (q[:, 0] - p[:, 0])
+
+    x0, y0 = x0[..., np.newaxis], y0[..., np.newaxis]
+    dx, dy = x1[..., np.newaxis] - x0, y1[..., np.newaxis] - y0
+    # point x0+t*dx is inside of edge if num + t*den >= 0:
+    num = nx * (x0 - p[:, 0]) + ny * (y0 - p[:, 1])
+    den = nx * dx + ny * dy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = -num / den
+    t_enter = np.where(den > 0, t, 0).max(axis=-1, keepdims=True)
+    t_leave = np.where(den < 0, t, 1).min(axis=-1, keepdims=True)
+    visible = ~((den == 0) & (num < 0)).any(axis=-1, keepdims=True) & (t_enter <= t_leave)
+
+    move0 = visible & (t_enter > 0)
+    move1 = visible & (t_leave < 1)
+    out = np.concatenate((np.where(move0, x0 + t_enter * dx, x0),
+                          np.where(move0, y0 + t_enter * dy, y0),
+                          np.where(move1, x0 + t_leave * dx, x1[..., np.newaxis]),
+                          np.where(move1, y0 + t_leave * dy, y1[..., np.newaxis])), axis=-1)
+    return out
@@ -1,5 +1,5 @@
 # coding=utf-8
-from scipy.stats import linregress
+import numpy as np
 
 
 def robustLinregress(x, y, n_iter=3, nstd=2):
@@ -10,6 +10,7 @@ def robustLinregress(x, y, n_iter=3, nstd=2):
     
     this method is faster and more stable than scipy.stats.theilslopes
     """
+    from scipy.stats import linregress  # slow import, not needed for robustLinregressStack
     for _ in range(n_iter):
         m, n = linregress(x, y)[:2]
         y_fit = x * m + n
@@ -24,41 +25,103 @@ def robustLinregress(x, y, n_iter=3, nstd=2):
     return linregress(x, y)
 
 
+def _maskedLinregress(x, y, w):
+    '''
+    least squares fit y=m*x+n for every row in y
+    w ... non-negative weights, x and y need to be finite where w==0
+    returns m, n
+    '''
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cnt = w.sum(axis=-1)
+        xm = (w * x).sum(axis=-1) / cnt
+        ym = (w * y).sum(axis=-1) / cnt
+        dx = x - xm[..., np.newaxis]
+        wdx = w * dx
+        m = (wdx * (y - ym[..., np.newaxis])).sum(axis=-1) / (wdx * dx).sum(axis=-1)
+    n = ym - m * xm
+    return m, n
+
+
+def robustLinregressStack(x, y, valid=None, n_iter=3, nstd=2):
+    '''
+    same as robustLinregress, but for many data series at once
+    using masked least squares (no scipy overhead)
+
+    x     ... (N,) or (B,N) x values
+    y     ... (B,N) y values
+    valid ... (B,N) bool, whether value is to be used
+              or non-negative weights, e.g. number of draws in a bootstrap sample
+    returns m (B,), n (B,)
+    '''
+    y = np.asarray(y, dtype=float)
+    x = np.asarray(x, dtype=float)
+    if valid is None:
+        w = np.ones(y.shape)
+    else:
+        w = valid.astype(float)
+        # invalid values are ignored, but need to be finite:
+        y = np.where(w > 0, y, 0)
+        x = np.where(w > 0, x, 0)
+    active = np.ones(y.shape[:-1], dtype=bool)
+    for _ in range(n_iter):
+        m, n = _maskedLinregress(x, y, w)
+        dy = y - (x * m[..., np.newaxis] + n[..., np.newaxis])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = ((w * dy ** 2).sum(axis=-1) / w.sum(axis=-1)) ** 0.5
+        inliers = w * (np.abs(dy) < nstd * std[..., np.newaxis])
+        # series with too few inliers are not changed anymore:
+        active &= inliers.sum(axis=-1) > 2
+        if not active.any():
+            break
+        w = np.where(active[..., np.newaxis], inliers, w)
+    return _maskedLinregress(x, y, w)
+
+
 if __name__ == '__main__':
-    import numpy as np
     import pylab as plt
     import sys
-    from time import time
+    from timeit import repeat
 
-    from scipy.stats import theilslopes
+    from scipy.stats import linregress, theilslopes
+
+    def outlierData(n, n_series=1, seed=0):
+        # noisy lines with outliers
+        rng = np.random.default_rng(seed)
+        x = np.arange(n)
+        yorig = np.linspace(0, 10, n)
+        y = yorig + ((rng.random((n_series, n)) - 0.5) * 3)
+        pos = rng.integers(0, 10, (n_series, n)) > 7
+        y[pos] *= rng.random(pos.sum()) * 3
+        return x, yorig, y
+
+    def bench(fn, number):
+        # best of 5 [s]
+        return min(repeat(fn, number=number, repeat=5)) / number
 
     n = 1000
-    x = np.arange(n)
-    yorig = np.linspace(0, 10, n)
-
-    # add noise:
-    y = yorig + ((np.random.rand(n) - 0.5) * 3)
-
-    # add some outliers:
-    pos = np.random.randint(0, 10, n) > 7
-#     vals = np.random.rand(pos.sum()) * 3
-    y[pos] *= np.random.rand((pos).sum()) * 3
-
-    # ACTION
-    t0 = time()
-    m, n = linregress(x, y)[:2]
-    y_fit1 = m * x + n
-    print('time linregress: ', time() - t0)
-    
-    t0 = time()
-    m, n = robustLinregress(x, y)[:2]
-    y_fit2 = m * x + n
-    print('time this: ', time() - t0)
-    
-    t0 = time()
-    m, n = theilslopes(y, x, 0.90)[:2]
-    y_fit3 = m * x + n
-    print('time theilslopes: ', time() - t0)
+    x, yorig, y = outlierData(n)
+    y = y[0]
+
+    # accuracy:
+    m, n0 = linregress(x, y)[:2]
+    y_fit1 = m * x + n0
+    m, n0 = robustLinregress(x, y)[:2]
+    y_fit2 = m * x + n0
+    m_stack, n_stack = robustLinregressStack(x, y[np.newaxis])
+    print('robustLinregressStack - robustLinregress: dm=%.1e, dn=%.1e' % (
+        abs(m_stack[0] - m), abs(n_stack[0] - n0)))
+    m, n0 = theilslopes(y, x, 0.90)[:2]
+    y_fit3 = m * x + n0
+
+    # speed:
+    print('time per series [ms]:')
+    print('linregress:\t\t%.3f' % (1e3 * bench(lambda: linregress(x, y), 100)))
+    print('robustLinregress:\t%.3f' % (1e3 * bench(lambda: robustLinregress(x, y), 100)))
+    print('theilslopes:\t\t%.3f' % (1e3 * bench(lambda: theilslopes(y, x, 0.9), 3)))
+    for n_series in (1, 2, 100, 1000):
+        xb, _, yb = outlierData(n, n_series)
+        t = bench(lambda: robustLinregressStack(xb, yb), 10)
+        print('robustLinregressStack(%i series):\t%.3f' % (n_series, 1e3 * t / n_series))
 
     if 'no_window' not in sys.argv:
         # PLOT
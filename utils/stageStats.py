@@ -0,0 +1,179 @@
+'''
+opt-in timing and memory statistics of processing stages
+(e.g. measure.measureVcut, resolutionFactor.resolutionFactor)
+
+    >>> stats = StageStats(memory=True)
+    >>> for img in imgs:
+    ...     resolutionFactor(*measureVcut(img, line, stats=stats)[0], stats=stats)
+    >>> stats.report()
+
+functions accept stats=None and use a shared no-op context then,
+so there is no measurable overhead if statistics are disabled
+'''
+
+import sys
+import threading
+import tracemalloc
+from collections import OrderedDict
+from contextlib import nullcontext
+from time import perf_counter
+
+import numpy as np
+
+_NULL = nullcontext()
+
+
+def stages(stats):
+    '''
+    returns function(name) -> context manager measuring stage [name]
+    or a no-op context if [stats] is None
+    '''
+    if stats is None:
+        return _noStage
+    return stats.stage
+
+
+def _noStage(name):
+    return _NULL
+
+
+class _Stage(object):
+    __slots__ = ('stats', 'name', 't0', 'mem0')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        if self.stats.memory:
+            tracemalloc.reset_peak()
+            self.mem0 = tracemalloc.get_traced_memory()[0]
+        self.t0 = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        dt = perf_counter() - self.t0
+        nbytes = 0
+        if self.stats.memory:
+            nbytes = tracemalloc.get_traced_memory()[1] - self.mem0
+        self.stats.add(self.name, dt, nbytes)
+        return False
+
+
+class StageStats(object):
+    '''
+    collects wall time [s] and allocated memory [bytes] per stage
+
+    memory   ... trace memory allocations (peak allocation within stage) with tracemalloc
+                 this slows down execution, so times are only comparable with memory=False
+                 stages must not be nested and are only measured in one thread then
+    callback ... function(name, seconds, nbytes) called after every stage
+
+    stages can be added from several threads while summary() is read (e.g. server.py)
+    '''
+
+    def __init__(self, memory=False, callback=None):
+        self.memory = memory
+        self.callback = callback
+        self.times = OrderedDict()  # name -> [seconds]
+        self.nbytes = OrderedDict()  # name -> [bytes]
+        self.last = OrderedDict()  # name -> (seconds, bytes) of last execution
+        self._lock = threading.Lock()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add(self, name, seconds, nbytes=0):
+        with self._lock:
+            if name not in self.times:
+                self.times[name] = []
+                self.nbytes[name] = []
+            self.times[name].append(seconds)
+            self.nbytes[name].append(nbytes)
+            self.last[name] = (seconds, nbytes)
+        if self.callback is not None:
+            self.callback(name, seconds, nbytes)
+
+    def stop(self):
+        '''
+        stop memory tracing
+        '''
+        if self.memory:
+            tracemalloc.stop()
+            self.memory = False
+
+    def summary(self):
+        '''
+        returns {stage: {'n', 'total', 'mean', 'median', 'p95', 'max', 'bytes_mean', 'bytes_max'}}
+        times in seconds
+        '''
+        with self._lock:
+            stages = [(name, np.array(times), np.array(self.nbytes[name]))
+                      for name, times in self.times.items()]
+        out = OrderedDict()
+        for name, t, b in stages:
+            out[name] = OrderedDict([
+                ('n', len(t)),
+                ('total', float(t.sum())),
+                ('mean', float(t.mean())),
+                ('median', float(np.median(t))),
+                ('p95', float(np.percentile(t, 95))),
+                ('max', float(t.max())),
+                ('bytes_mean', float(b.mean())),
+                ('bytes_max', int(b.max()))])
+        return out
+
+    def histogram(self, name, bins=10):
+        '''
+        histogram of execution times of stage [name] with logarithmic bins
+        returns counts, bin edges [s]
+        '''
+        with self._lock:
+            t = np.array(self.times[name])
+        lo, hi = max(t.min(), 1e-9), max(t.max(), 1e-9)
+        if hi <= lo:
+            hi = lo * 1.01
+        return np.histogram(t, np.geomspace(lo, hi, bins + 1))
+
+    def report(self, file=None, bins=10, width=30):
+        '''
+        print summary table and a text histogram for every stage
+        '''
+        file = sys.stdout if file is None else file
+        summary = self.summary()
+        total = sum(s['total'] for s in summary.values()) or 1
+        print('%-16s %7s %10s %10s %10s %10s %6s %12s' % (
+            'stage', 'n', 'mean[ms]', 'median[ms]', 'p95[ms]', 'max[ms]', 'share', 'bytes_mean'),
+            file=file)
+        for name, s in summary.items():
+            print('%-16s %7i %10.3f %10.3f %10.3f %10.3f %5.1f%% %12.0f' % (
+                name, s['n'], s['mean'] * 1e3, s['median'] * 1e3, s['p95'] * 1e3,
+                s['max'] * 1e3, 100 * s['total'] / total, s['bytes_mean']), file=file)
+        for name in summary:
+            counts, edges = self.histogram(name, bins)
+            print('\n%s [ms]' % name, file=file)
+            scale = width / max(1, counts.max())
+            for c, e0, e1 in zip(counts, edges[:-1], edges[1:]):
+                print('%10.3f-%-10.3f %6i %s' % (e0 * 1e3, e1 * 1e3, c, '#' * int(round(c * scale))),
+                      file=file)
+
+
+if __name__ == '__main__':
+    # hot spots of measureVcut and resolutionFactor for synthetic v-cuts
+    from generate import patVcut
+    from measure import measureVcut
+    from resolutionFactor import resolutionFactor
+
+    rng = np.random.default_rng(0)
+    imgs = [patVcut(std, rng=rng) for std in rng.uniform(1, 4, 50)]
+
+    for memory in (False, True):
+        print('\nmemory=%s' % memory)
+        stats = StageStats(memory=memory)
+        for img_masked, img_unmasked, line in imgs:
+            out = measureVcut(img_masked, line, img_unmasked, stats=stats)[0]
+            resolutionFactor(*out, stats=stats)
+        stats.stop()
+        stats.report(bins=5)
@@ -1,13 +1,13 @@
 import numpy as np
-from scipy.ndimage.filters import gaussian_filter
-from utils.findXAt import findXAt
+
+# local
+from utils import calibration
 
 # <<<<<<<<<<<<<<<<<<<<<<<<<
-# FOR THE CALCULATION OF THE FOLLOWING CONSTANTS SEE
+# fres<->std coefficients 'std2fres_bigger1', 'std2fres_smaller1'
+# are loaded from the active calibration (see utils/calibration.py)
+# FOR THEIR CALCULATION SEE
 # relation_resolutionFactor_vs_std.py
-# fres<->std
-_std2fres_bigger1 = 1.92675391
-_std2fres_smaller1 = (1.11308561, 0.73214517, 0.78312647, 1.42350311)
 # >>>>>>>>>>>>>>>>>>>>>>>>>
 
 
@@ -29,6 +29,7 @@ def std2PSF(std, k=9, kSize=None):
     k[int] ... determine kSize through having k times std within
     kSize[float, tuple] ... kernel size in x and y
     '''
+    from scipy.ndimage import gaussian_filter
     # create point spread function (PSF) as 2d gaussian:
     kSize = _kSize(std, k, kSize)
     if type(kSize) not in (list, tuple):
@@ -44,28 +45,69 @@ def std2PSF(std, k=9, kSize=None):
     return psf
 
 
+def std2Kernel1d(std, k=9, kSize=None):
+    '''
+    1d Gaussian kernels in y and x
+    std2PSF(std) is the outer product of both kernels
+
+    returns kernel_y, kernel_x
+    '''
+    from scipy.ndimage import gaussian_filter1d
+    kSize = _kSize(std, k, kSize)
+    if type(kSize) not in (list, tuple):
+        kSize = (kSize, kSize)
+    kernels = []
+    for si, ki in zip(np.broadcast_to(std, (2,)), kSize):
+        inp = np.zeros(ki)
+        inp[ki // 2] = 1
+        kernel = gaussian_filter1d(inp, si, mode='constant')
+        kernels.append(kernel / kernel.sum())
+    return kernels
+
+
 def _std2ResFactor_fitfn(x, m, n, o, p):
     return m * np.log(x * n) + x * o + p
 
 
 def std2ResFactor(std):
-    if std > 1:
-        return _std2fres_bigger1 * std
-#     a, b, c, d = _std2fres_smaller1
-    return max(1,  # factor cannot be smaller than 1
-               _std2ResFactor_fitfn(std, *_std2fres_smaller1))
-#                a * np.log(std * b) + std * c - d)
+    '''
+    std[float, array] ... standard deviation of Gaussian blur kernel
+    returns resolution factor
+    '''
+    coeffs = calibration.coeffs()
+    std = np.asarray(std, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        smaller1 = np.maximum(1,  # factor cannot be smaller than 1
+                              _std2ResFactor_fitfn(std, *coeffs['std2fres_smaller1']))
+    return np.where(std > 1, coeffs['std2fres_bigger1'] * std, smaller1)[()]
+
+
+def _resFactor2std_smaller1(fres, m, n, o, p):
+    # analytic inverse of _std2ResFactor_fitfn:
+    # fres = m*log(x*n) + x*o + p
+    # -> x = m/o * W(o/(m*n) * exp((fres-p)/m)) ... W: Lambert W function
+    from scipy.special import lambertw
+    return m / o * lambertw(o / (m * n) * np.exp((fres - p) / m)).real
 
 
 def resFactor2std(fres):
-    # TODO: invert std2ResFactor properly
-    # lazy inverse
-    if fres < 1:
-        return 0.5
-    
-    xArr = np.linspace(0.5, 10, 1000)
-    yArr = np.array([std2ResFactor(x) for x in xArr])
-    return findXAt(xArr, yArr, fres)
+    '''
+    inverse of std2ResFactor
+    fres[float, array] ... resolution factor
+    returns standard deviation of Gaussian blur kernel
+    '''
+    coeffs = calibration.coeffs()
+    smaller1, bigger1 = coeffs['std2fres_smaller1'], coeffs['std2fres_bigger1']
+    fres = np.asarray(fres, dtype=float)
+    # resolution factors at std=1 - std2ResFactor is not continuous here:
+    fres_std1 = _std2ResFactor_fitfn(1, *smaller1), bigger1
+    return np.select((fres < 1,
+                      fres < fres_std1[0],
+                      fres < fres_std1[1]),
+                     (0.5,
+                      _resFactor2std_smaller1(fres, *smaller1),
+                      1.0),  # jump between both branches
+                     fres / bigger1)[()]
 
 
 if __name__ == '__main__':
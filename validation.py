@@ -6,45 +6,39 @@ validate v-cut measurement on synthetic data
 '''
 
 import numpy as np
-import pylab as plt
 
 # local
-from generate import patVcut
-from measure import measureVcut
-from utils.transforms import resFactor2std
-from resolutionFactor import resolutionFactor
+from sweep import sweep, measuredStd
 
 
-def main():
-    X = []  # input image sharpness (standard deviation)
-    Y = []  # measured image sharpness
-    Ys = []  # std for Y
-    
-    for std in np.linspace(0.5, 5, 30):  # for variable image sharpness expressed as standard deviation of gaussian blur kernel
-        yi = []
-        print(std)
-        for _ in range(3):  # repeat every measurement 10 times
+def compareDtypes(stds=np.linspace(0.5, 5, 30), n_repeat=3, seed=0, n_workers=None):
+    '''
+    measure the same synthetic images with float64 and float32 compute dtype
+    returns measured stds (len(stds), n_repeat) for both dtypes
+    '''
+    y64 = sweep(measuredStd, stds, n_repeat, seed, n_workers, dtype=np.float64)
+    y32 = sweep(measuredStd, stds, n_repeat, seed, n_workers, dtype=np.float32)
+    d = np.abs(y32 - y64)
+    print('%6s %10s %10s %12s %12s' % ('std', 'float64', 'float32', 'max|diff|', 'max rel.'))
+    for s, a, b, di in zip(stds, y64, y32, d):
+        print('%6.2f %10.4f %10.4f %12.2e %12.2e' % (s, a.mean(), b.mean(), di.max(),
+                                                      (di / a).max()))
+    print('all: max|diff| %.2e, mean|diff| %.2e, max rel. %.2e' % (
+        d.max(), d.mean(), (d / y64).max()))
+    print('measurement error (float64): mean|measured-given| %.2e' % (
+        np.abs(y64 - stds[:, np.newaxis]).mean()))
+    return y64, y32
 
-            # synth. measurement pattern:
-            img_masked, img_unmasked, line = patVcut(std)
-            # get image contrast along middle line:
-            r, y, calc_angle = measureVcut(img_masked, line=line, img_unmasked=img_unmasked)[0]
-            
-            f_res = resolutionFactor(r, y, calc_angle)
-            
-            std2 = resFactor2std(f_res)
-            yi.append(std2)
-            
-        if(len(yi)):
-            X.append(std)
-            Y.append(np.mean(yi))
-            Ys.append(np.std(yi))
 
-    print(X, Y)
+def main(n_workers=None, seed=0):
+    import pylab as plt
+    X = np.linspace(0.5, 5, 30)  # for variable image sharpness expressed as standard deviation of gaussian blur kernel
+    # measured image sharpness, repeat every measurement 3 times:
+    yi = sweep(measuredStd, X, 3, seed, n_workers)
+    Y = yi.mean(axis=1)
+    Ys = yi.std(axis=1)  # std for Y
 
-    # plot
-    Ys = np.array(Ys)
-    Y = np.array(Y)
+    print(X, Y)
 
     # 1 to 1 relation
     plt.plot([0, max(X)], [0, max(X)], c='k')
@@ -62,5 +56,14 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description='validate v-cut measurement on synthetic data')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of processes')
+    parser.add_argument('--compare_dtypes', action='store_true',
+                        help='print differences between float64 and float32 compute dtype')
+    args = parser.parse_args()
+    if args.compare_dtypes:
+        compareDtypes(n_workers=args.workers)
+    else:
+        main(args.workers)
 